@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 import argparse
+import functools
 import json
+import os
 import sys
 
 import yaml
@@ -16,6 +18,30 @@ import fractale.utils as utils
 # This will pretty print all exceptions in rich
 from fractale.transformer.flux.validate import Validator
 
+# Prefer the libyaml (C) loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# ijson is optional, and only used to stream resources from large JSON jobspecs
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Jobspecs larger than this (bytes) are streamed when counting resources
+stream_threshold = 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def get_validator(name="batch"):
+    """
+    Get a validator, building (and keeping) one per process.
+    Construction sets up the Flux command parser, which we only need once.
+    """
+    return Validator(name)
+
 
 def display_error(content, issue):
     """
@@ -77,35 +103,80 @@ def run_command():
     raise ValueError(f"The command {args.command} is not known")
 
 
+def load_content(path, content):
+    """
+    Load jobspec content (bytes), returning the loaded object and json.
+
+    JSON is a subset of YAML, but parsing it as YAML (and dumping it back)
+    is much slower, so we pass JSON through directly when we can.
+    """
+    if path.endswith(".json") or content.lstrip()[:1] in (b"{", b"["):
+        try:
+            return json.loads(content), content
+        except ValueError:
+            pass
+    loaded = yaml.load(content, Loader=SafeLoader)
+    return loaded, json.dumps(loaded, separators=(",", ":"))
+
+
 def validate(path):
     """
     Validate a batch.sh, jobspec.yaml, or jobspec.json.
     """
     jobspec = None
-    content = utils.read_file(path)
-    yaml_content = yaml.safe_load(content)
-    json_content = json.dumps(yaml_content)
+    # The parsers handle decoding, we only need a string to show errors
+    content = utils.read_bytes(path)
+    yaml_content, json_content = load_content(path, content)
     if not isinstance(yaml_content, dict):
-        validator = Validator("batch")
+        validator = get_validator("batch")
         try:
             # Setting fail fast to False means we will get ALL errors at once
             validator.validate(path, fail_fast=False)
         except Exception as e:
-            display_error(content, str(e))
+            display_error(content.decode("utf-8", "replace"), str(e))
             sys.exit(1)
     else:
         try:
             jobspec = validate_jobspec(json_content)
         except Exception as e:
-            display_error(content, str(e))
+            display_error(content.decode("utf-8", "replace"), str(e))
             sys.exit(1)
     return jobspec
 
 
+def walk_resources(resources, count=1):
+    """
+    Walk a list of resources, yielding each with its total count.
+    This mirrors Jobspec.resource_walk, where counts multiply down the tree.
+    """
+    for resource in resources:
+        res_count = count * resource["count"]
+        yield resource, res_count
+        yield from walk_resources(resource.get("with", []), res_count)
+
+
+def stream_resources(path):
+    """
+    Stream top level resources from a large JSON jobspec, counting as we go.
+    This does not materialize (or validate) the rest of the jobspec.
+    """
+    print(
+        "The jobspec is large and was not validated. Here are the total resource"
+        " counts per type requested by the provided jobspec:"
+    )
+    with open(path, "rb") as fd:
+        for resource in ijson.items(fd, "resources.item", use_float=True):
+            for res, count in walk_resources([resource]):
+                print(f"Type: {res['type']}, count: {count}")
+
+
 def count_resources(path):
     """
     Count the resources in a jobspec.yaml or similar.
     """
+    if ijson is not None and path.endswith(".json") and os.path.getsize(path) > stream_threshold:
+        return stream_resources(path)
+
     jobspec = validate(path)
     if jobspec is not None:
         print(
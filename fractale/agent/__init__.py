@@ -1,13 +1,15 @@
+import types
+
 from fractale.agent.build import BuildAgent
 from fractale.agent.cost import CostAgent
 from fractale.agent.flux import FluxBatchAgent
 from fractale.agent.kubernetes import KubernetesJobAgent, MiniClusterAgent
 from fractale.agent.manager import ManagerAgent
 
-
-def get_agents():
-    # The Manager Agent is a special kind that can orchestrate other managers.
-    return {
+# The Manager Agent is a special kind that can orchestrate other managers.
+# This is read-only - copy it if you need to add to it.
+agents = types.MappingProxyType(
+    {
         "cost": CostAgent,
         "build": BuildAgent,
         "kubernetes-job": KubernetesJobAgent,
@@ -15,3 +17,8 @@ def get_agents():
         "minicluster": MiniClusterAgent,
         "flux-batch": FluxBatchAgent,
     }
+)
+
+
+def get_agents():
+    return agents
@@ -1,17 +1,68 @@
+import concurrent.futures
 import copy
+import datetime
+import functools
+import json
 import os
 import re
 import sys
+import threading
 import time
 
+import google.api_core.exceptions as google_exceptions
 import google.generativeai as genai
 
 import fractale.agent.defaults as defaults
 import fractale.agent.logger as logger
 import fractale.utils as utils
+from fractale.agent.cache import get_cache
 from fractale.agent.context import get_context
 from fractale.agent.decorators import save_result, timed
 
+# Gemini models are shared by agents in the process (each agent has its own chat)
+models = {}
+models_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def configure_gemini():
+    """
+    Configure the Gemini API key, once per process.
+    """
+    try:
+        genai.configure(api_key=os.environ["GEMINI_API_KEY"])
+    except KeyError:
+        sys.exit("ERROR: GEMINI_API_KEY environment variable not set.")
+
+
+def get_model(name=None, system_instruction=None):
+    """
+    Get a shared Gemini model (optionally with a system instruction), creating it on first use.
+    """
+    name = name or defaults.gemini_model
+    key = (name, system_instruction)
+    with models_lock:
+        if key not in models:
+            configure_gemini()
+            models[key] = genai.GenerativeModel(name, system_instruction=system_instruction)
+        return models[key]
+
+
+@functools.lru_cache(maxsize=None)
+def code_block_pattern(code_type):
+    """
+    Compiled pattern for a fenced code block, once per code type.
+    """
+    return re.compile(f"```(?:{code_type})?\n(.*?)```", re.DOTALL)
+
+
+@functools.lru_cache(maxsize=1)
+def get_executor():
+    """
+    Shared thread pool for running agents (they mostly wait on network requests).
+    """
+    return concurrent.futures.ThreadPoolExecutor(max_workers=defaults.gemini_batch_workers)
+
 
 class Agent:
     """
@@ -27,6 +78,9 @@ class Agent:
     # name and description should be on the class
     state_variables = ["result", "error_message"]
 
+    # Assets per type (e.g., logs for each attempt) to keep in memory
+    max_assets = 16
+
     def __init__(
         self, use_cache=False, results_dir=None, save_incremental=False, max_attempts=None
     ):
@@ -42,6 +96,9 @@ class Agent:
         # The user can save if desired - caching the context to skip steps that already run.
         self.setup_cache(use_cache)
 
+        # Guards metadata updates when the agent is run from a thread
+        self.lock = threading.RLock()
+
         # This supports saving custom logs and step (attempt) metadata
         self.init_metadata()
 
@@ -66,6 +123,32 @@ class Agent:
             "counts": {"retries": 0, "return_to_manager": 0, "return_to_human": 0},
         }
 
+    def save_asset(self, key, item):
+        """
+        Save an asset for the current attempt (e.g., logs) to metadata.
+
+        We only keep the most recent max_assets in memory. Older ones are
+        appended to a jsonl file in the results directory.
+        """
+        with self.lock:
+            assets = self.metadata["assets"].setdefault(key, [])
+            assets.append({"item": item, "attempt": self.attempts})
+            if self.max_assets is not None and len(assets) > self.max_assets:
+                self.flush_assets(key, assets[: -self.max_assets])
+                del assets[: -self.max_assets]
+
+    def flush_assets(self, key, entries):
+        """
+        Append asset entries to <results_dir>/<agent>-<key>.jsonl
+        """
+        if not os.path.exists(self.results_dir):
+            os.makedirs(self.results_dir, exist_ok=True)
+        assets_file = os.path.join(self.results_dir, f"{self.name}-{key}.jsonl")
+
+        # Serialize now (the entries are about to be dropped) but write in the background
+        content = "".join(json.dumps(entry) + "\n" for entry in entries)
+        utils.append_later(content, assets_file)
+
     @save_result
     def run(self, context):
         """
@@ -90,6 +173,44 @@ class Agent:
         self.save_cache(context)
         return context
 
+    def run_async(self, context, executor=None, **kwargs):
+        """
+        Run the agent in a thread, and return a future for the final context.
+
+        This is intended for independent contexts. Each should have its own
+        agent instance (and chat history). Other arguments are passed to run.
+        """
+        executor = executor or get_executor()
+        return executor.submit(self.run, context, **kwargs)
+
+    def run_many(self, contexts):
+        """
+        Run independent contexts at once, and return their final contexts.
+
+        Each context gets a new agent like this one, so attempts and chat
+        history are not shared. The step cache holds one context, so it is
+        not used here. The contexts run on their own pool (not the shared one),
+        so this can be called from an agent that is itself running in a pool.
+        """
+        if not contexts:
+            return []
+        agents = [self.new_agent() for _ in contexts]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(contexts)) as executor:
+            futures = [
+                agent.run_async(context, executor) for agent, context in zip(agents, contexts)
+            ]
+            return [future.result() for future in futures]
+
+    def new_agent(self):
+        """
+        Get a new agent like this one, with its own attempts and chat history.
+        """
+        return type(self)(
+            results_dir=self.results_dir,
+            save_incremental=self.save_incremental,
+            max_attempts=self.max_attempts,
+        )
+
     def init(self):
         pass
 
@@ -242,8 +363,7 @@ class Agent:
         """
         Parse a code block from the response
         """
-        pattern = f"```(?:{code_type})?\n(.*?)```"
-        match = re.search(pattern, content, re.DOTALL)
+        match = code_block_pattern(code_type).search(content)
         if match:
             return match.group(1).strip()
         if content.startswith(f"```{code_type}"):
@@ -275,49 +395,160 @@ class GeminiAgent(Agent):
     A base for an agent that uses the Gemini API.
     """
 
+    # Provider-side caches for static system instructions, shared by all agents
+    # (which can run in threads, so we create each under the lock)
+    cached_contents = {}
+    cached_contents_lock = threading.Lock()
+
     def init(self):
-        self.model = genai.GenerativeModel(defaults.gemini_model)
+        self.model = get_model()
         self.chat = self.model.start_chat()
-        try:
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        except KeyError:
-            sys.exit("ERROR: GEMINI_API_KEY environment variable not set.")
+
+    def get_cached_model(self, system_instruction, ttl_minutes=5):
+        """
+        Get a model with a static system instruction cached by the provider.
+
+        The cache is created once and reused by every agent with the same
+        instruction until it expires. An instruction under the minimum size for
+        caching (estimated at ~4 characters per token) is not sent to the cache,
+        and neither is one the API refused to cache before. In both cases we use
+        the shared model with the system instruction, which still comes first.
+        """
+        if len(system_instruction) // 4 < defaults.gemini_cache_min_tokens:
+            return get_model(system_instruction=system_instruction)
+        configure_gemini()
+
+        with self.cached_contents_lock:
+            cache = self.cached_contents.get(system_instruction)
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if cache is None or (cache and cache.expire_time <= now):
+                try:
+                    cache = genai.caching.CachedContent.create(
+                        model=defaults.gemini_model,
+                        system_instruction=system_instruction,
+                        ttl=datetime.timedelta(minutes=ttl_minutes),
+                    )
+                # The API refused to cache it (e.g., an unsupported model), other errors are raised
+                except (google_exceptions.InvalidArgument, google_exceptions.NotFound):
+                    cache = False
+                self.cached_contents[system_instruction] = cache
+
+        if cache:
+            return genai.GenerativeModel.from_cached_content(cached_content=cache)
+        return get_model(system_instruction=system_instruction)
 
     # We don't add timed here because we do it custom
-    def ask_gemini(self, prompt, with_history=True):
+    def ask_gemini(self, prompt, with_history=True, until_code_block=None):
         """
         Ask gemini adds a wrapper with some error handling.
+
+        If until_code_block is a code type (e.g., yaml) we stream the response
+        and stop reading once the first complete code block has arrived. The chat
+        history (and the response cache, if enabled) then keep the text we read,
+        so the next request continues from what we actually used.
         """
+        # If enabled, a repeated request (same prompt and history) is not sent again
+        cache = get_cache()
+        if cache is not None:
+            history = None
+            if with_history:
+                history = [part.text for content in self.chat.history for part in content.parts]
+            model_name = getattr(self.model, "model_name", defaults.gemini_model)
+            key = cache.key(f"{model_name}:{self.name}", prompt, history)
+            content = cache.get(key)
+            if content is not None:
+                with self.lock:
+                    counts = self.metadata["counts"]
+                    counts["llm_cache_hits"] = counts.get("llm_cache_hits", 0) + 1
+                # Keep the conversation as if we had asked
+                if with_history:
+                    self.chat.history = self.chat.history + [
+                        {"role": "user", "parts": [prompt]},
+                        {"role": "model", "parts": [content]},
+                    ]
+                return content
+
         try:
             start = time.perf_counter()
+            stream = until_code_block is not None
             if with_history:
-                response = self.chat.send_message(prompt)
+                previous = list(self.chat.history)
+                response = self.chat.send_message(prompt, stream=stream)
+            else:
+                response = self.model.generate_content(prompt, stream=stream)
+
+            # This line can fail. If it succeeds, return entire response
+            truncated = False
+            if stream:
+                content, truncated = self.read_until_code_block(response, until_code_block)
             else:
-                response = self.model.generate_content(prompt)
+                content = response.text.strip()
             end = time.perf_counter()
 
-            if self.save_incremental:
-                self.save_gemini_metadata(end - start, response, with_history)
+            # The chat can't finish a response we stopped reading, so we record the turn ourselves
+            if truncated and with_history:
+                self.chat.history = previous + [
+                    {"role": "user", "parts": [prompt]},
+                    {"role": "model", "parts": [content]},
+                ]
 
-            # This line can fail. If it succeeds, return entire response
-            return response.text.strip()
+            if self.save_incremental:
+                self.save_gemini_metadata(end - start, response, with_history, truncated)
+            if cache is not None:
+                tokens = None if truncated else response.usage_metadata.total_token_count
+                cache.set(key, content, tokens)
+            return content
 
         except ValueError as e:
             print(f"[Error] The API response was blocked and contained no text: {str(e)}")
             return "GEMINI ERROR: The API returned an error (or stop) and we need to try again."
 
-    def save_gemini_metadata(self, elapsed_time, response, with_history):
+    def read_until_code_block(self, response, code_type):
         """
-        Save gemini response metadata and elapsed time
+        Read a streamed response until the first complete code block.
+
+        Returns the text and True if we stopped before the end of the response.
         """
-        if "ask_gemini" not in self.metadata:
-            self.metadata["ask_gemini"] = []
-        self.metadata["ask_gemini"].append(
-            {
-                "conversation_history": with_history,
-                "prompt_token_count": response.usage_metadata.prompt_token_count,
-                "candidates_token_count": response.usage_metadata.candidates_token_count,
-                "total_token_count": response.usage_metadata.total_token_count,
-                "time_seconds": elapsed_time,
-            }
-        )
+        pattern = code_block_pattern(code_type)
+        content = ""
+        for chunk in response:
+            content += chunk.text
+
+            # The last chunk has a finish reason, and we read it to the end
+            finished = chunk.candidates and chunk.candidates[0].finish_reason
+            if not finished and pattern.search(content):
+                return content.strip(), True
+        return content.strip(), False
+
+    def ask_gemini_batch(self, prompts, workers=None):
+        """
+        Ask gemini for a set of independent prompts (without history).
+
+        The requests are sent concurrently and responses come back in the
+        same order as the prompts.
+        """
+        workers = workers or min(len(prompts), defaults.gemini_batch_workers) or 1
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(
+                executor.map(lambda prompt: self.ask_gemini(prompt, with_history=False), prompts)
+            )
+
+    def save_gemini_metadata(self, elapsed_time, response, with_history, truncated=False):
+        """
+        Save gemini response metadata and elapsed time
+
+        If we stopped reading a streamed response early, we don't know how many
+        tokens were generated (and billed), so we don't record the counts.
+        """
+        usage = response.usage_metadata
+        with self.lock:
+            self.metadata.setdefault("ask_gemini", []).append(
+                {
+                    "conversation_history": with_history,
+                    "prompt_token_count": usage.prompt_token_count,
+                    "candidates_token_count": None if truncated else usage.candidates_token_count,
+                    "total_token_count": None if truncated else usage.total_token_count,
+                    "truncated": truncated,
+                    "time_seconds": elapsed_time,
+                }
+            )
@@ -4,20 +4,56 @@ from fractale.agent.decorators import timed
 from fractale.agent.context import get_context
 from fractale.agent.errors import DebugAgent
 import fractale.agent.logger as logger
-import fractale.utils as utils
 import argparse
 
 from rich import print
-from rich.syntax import Syntax
 
+import collections
 import re
 import os
 import sys
-import shutil
 import tempfile
 import subprocess
 import textwrap
 
+# Number of docker build output lines to keep for debugging
+build_log_lines = 512
+
+# Compiled once, these are used for every name and Dockerfile generation
+invalid_name_chars = re.compile(r"[^a-zA-Z0-9_.-]")
+leading_separators = re.compile(r"^[._-]*")
+trailing_separators = re.compile(r"[._-]*$")
+dockerfile_block = re.compile("```(?:docker|dockerfile)?\n(.*?)```", re.DOTALL)
+
+# Build output lines that are unlikely to help with debugging
+skipped_lines = [
+    "Get:",
+    "Preparing to unpack",
+    "Unpacking ",
+    "Selecting previously ",
+    "Setting up ",
+    "update-alternatives",
+    "Reading database ...",
+]
+filtered_output = re.compile("(%s)" % "|".join(skipped_lines))
+build_step = re.compile(r"#(\d)+ ")
+
+
+def tail_error(output, max_size=8192, context_size=1024):
+    """
+    Get the end of a build log, starting a little before the last error.
+
+    Most of a failed build log is irrelevant to the fix, and the debug agent
+    pays for every token. We never return more than max_size characters.
+    """
+    if len(output) <= max_size:
+        return output
+    start = len(output) - max_size
+    index = output.lower().rfind("error")
+    if index != -1:
+        start = max(start, index - context_size)
+    return output[start:]
+
 
 class BuildAgent(GeminiAgent):
     """
@@ -91,19 +127,14 @@ class BuildAgent(GeminiAgent):
         Remove standard lines (e.g., apt install stuff) that likely won't help but
         add many thousands of tokens... (in testing, from 272K down to 2k)
         """
-        skips = [
-            "Get:",
-            "Preparing to unpack",
-            "Unpacking ",
-            "Selecting previously ",
-            "Setting up ",
-            "update-alternatives",
-            "Reading database ...",
-        ]
-        regex = "(%s)" % "|".join(skips)
-        output = "\n".join([x for x in output.split("\n") if not re.search(regex, x)])
-        # Try to match lines that start with #<number>
-        return "\n".join([x for x in output.split("\n") if not re.search(r"^#(\d)+ ", x)])
+        # Also skip lines that start with #<number>
+        return "\n".join(
+            [
+                x
+                for x in output.split("\n")
+                if not filtered_output.search(x) and not build_step.match(x)
+            ]
+        )
 
     @timed
     def run_step(self, context):
@@ -118,32 +149,36 @@ class BuildAgent(GeminiAgent):
         4. The current object to generate should be put into result.
         5. The current issue or error goes into error_message.
         """
-        # This will either generate fresh or rebuild erroneous Dockerfile
-        # We don't return the dockerfile because it is updated in the context
-        self.generate_dockerfile(context)
-        logger.custom(
-            context.result, title="[green]Dockerfile or Response[/green]", border_style="green"
-        )
+        # Each failed build loops back here with the error message.
+        while True:
 
-        # Set the container on the context for a next step to use it...
-        container = context.get("container") or self.generate_name(context.application)
-        context.container = container
+            # This will either generate fresh or rebuild erroneous Dockerfile
+            # We don't return the dockerfile because it is updated in the context
+            self.generate_dockerfile(context)
+            logger.custom(
+                context.result, title="[green]Dockerfile or Response[/green]", border_style="green"
+            )
+
+            # Set the container on the context for a next step to use it...
+            container = context.get("container") or self.generate_name(context.application)
+            context.container = container
+
+            # Build it! We might want to only allow a certain number of retries or incremental changes.
+            return_code, output = self.build(context)
+            if return_code == 0:
+                self.print_result(context.result)
+                logger.success(f"Build complete in {self.attempts} attempts")
+                self.load(context)
+                break
 
-        # Build it! We might want to only allow a certain number of retries or incremental changes.
-        return_code, output = self.build(context)
-        if return_code == 0:
-            self.print_result(context.result)
-            logger.success(f"Build complete in {self.attempts} attempts")
-            self.load(context)
-        else:
             # Filter out likely not needed lines (ubuntu install)
             output = self.filter_output(output)
             logger.error(f"Build failed:\n{output[-1000:]}")
             print("\n[bold cyan] Requesting Correction from Dockerfile Build Agent[/bold cyan]")
 
             # Ask the debug agent to better instruct the error message
-            # This becomes a more guided output
-            context.error_message = output
+            # This becomes a more guided output. It only needs the end of the log.
+            context.error_message = tail_error(output)
 
             # This updates the error message to be the output
             context = DebugAgent().run(context, requires=prompts.requires)
@@ -167,9 +202,6 @@ class BuildAgent(GeminiAgent):
 
             self.attempts += 1
 
-            # Update the context with error message
-            return self.run_step(context)
-
         # Add generation line
         self.write_file(context, context.result)
 
@@ -219,6 +251,9 @@ class BuildAgent(GeminiAgent):
         """
         Print Dockerfile with highlighted Syntax
         """
+        # Syntax pulls in pygments, so we only import it when needed
+        from rich.syntax import Syntax
+
         highlighted_syntax = Syntax(dockerfile, "docker", theme="monokai", line_numbers=True)
         logger.custom(
             highlighted_syntax, title="Final Dockerfile", border_style="green", expand=True
@@ -229,15 +264,15 @@ class BuildAgent(GeminiAgent):
         If no container URI provided, generate a name based on application.
         """
         # Replace invalid characters with hyphens
-        name = re.sub(r"[^a-zA-Z0-9_.-]", "-", name)
+        name = invalid_name_chars.sub("-", name)
 
         # First character needs to be alphanumeric
         if not name[0].isalnum():
             name = "c" + name
 
         # Remove leading/trailing separators if they exist
-        name = re.sub(r"^[._-]*", "", name)
-        name = re.sub(r"[._-]*$", "", name)
+        name = leading_separators.sub("", name)
+        name = trailing_separators.sub("", name)
 
         # Truncate to a maximum of 63 characters and strip crap
         name = name[:63].strip("-")
@@ -258,12 +293,6 @@ class BuildAgent(GeminiAgent):
         if not dockerfile:
             raise ValueError("No dockerfile content provided.")
 
-        build_dir = tempfile.mkdtemp()
-        print(f"[dim]Created temporary build context: {build_dir}[/dim]")
-
-        # Write the Dockerfile to the temporary directory
-        utils.write_file(dockerfile, os.path.join(build_dir, "Dockerfile"))
-
         # If only one max attempt, don't print here, not important to show.
         if self.max_attempts is not None and self.max_attempts > 1:
             logger.custom(
@@ -277,28 +306,63 @@ class BuildAgent(GeminiAgent):
             # Note that buildx for multiple platforms must be used with push
             prefix = ["docker", "buildx", "build", "--platform", context.platforms, "--push"]
 
-        # Run the build process using the temporary directory as context
-        p = subprocess.run(
-            prefix + ["--network", "host", "-t", context.container, "."],
-            capture_output=True,
-            text=True,
-            cwd=build_dir,
-            check=False,
-        )
-        # Clean up after we finish
-        shutil.rmtree(build_dir, ignore_errors=True)
-        return (p.returncode, p.stdout + p.stderr)
+        from rich.console import Console
+        from rich.markup import escape
+
+        # The context manager ensures we clean up, even on error
+        with tempfile.TemporaryDirectory() as build_dir:
+            print(f"[dim]Created temporary build context: {build_dir}[/dim]")
+
+            # Write the Dockerfile to the temporary directory
+            with open(os.path.join(build_dir, "Dockerfile"), "wb") as fd:
+                fd.write(dockerfile.encode("utf-8"))
+
+            # Run the build process using the temporary directory as context
+            # We only keep the tail of the log, which is what the debug agent needs
+            tail = collections.deque(maxlen=build_log_lines)
+            with Console().status("[dim]Building...[/dim]") as status:
+                with subprocess.Popen(
+                    prefix + ["--network", "host", "-t", context.container, "."],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    cwd=build_dir,
+                    text=True,
+                    errors="replace",
+                    bufsize=1,
+                ) as proc:
+                    for line in proc.stdout:
+                        tail.append(line)
+                        status.update(f"[dim]{escape(line.strip()[:120])}[/dim]")
+        if proc.returncode == 0:
+            return (0, "")
+        return (proc.returncode, "".join(tail))
 
     def save_dockerfile(self, dockerfile):
         """
         Save logs to metadata
         """
         if self.save_incremental:
-            if "dockerfile" not in self.metadata["assets"]:
-                self.metadata["assets"]["dockerfile"] = []
-            self.metadata["assets"]["dockerfile"].append(
-                {"item": dockerfile, "attempt": self.attempts}
-            )
+            self.save_asset("dockerfile", dockerfile)
+
+    def parse_dockerfile(self, content):
+        """
+        Get the Dockerfile from the first fenced block of a response.
+
+        The common case (one block tagged docker, dockerfile, or nothing) is
+        handled by partition, and we only use a regular expression otherwise.
+        """
+        _, fence, rest = content.partition("```")
+        if fence:
+            tag, newline, rest = rest.partition("\n")
+            body, fence, _ = rest.partition("```")
+            if newline and fence and tag in ("", "docker", "dockerfile"):
+                return body.strip()
+
+        # This can be provided as docker or dockerfile
+        match = dockerfile_block.search(content)
+        if match:
+            return match.group(1).strip()
+        return self.get_code_block(content, "dockerfile")
 
     @timed
     def generate_dockerfile(self, context):
@@ -315,13 +379,7 @@ class BuildAgent(GeminiAgent):
 
         # Try to remove Dockerfile from code block
         try:
-            # This can be provided as docker or dockerfile
-            pattern = "```(?:docker|dockerfile)?\n(.*?)```"
-            match = re.search(pattern, content, re.DOTALL)
-            if match:
-                dockerfile = match.group(1).strip()
-            else:
-                dockerfile = self.get_code_block(content, "dockerfile")
+            dockerfile = self.parse_dockerfile(content)
             self.save_dockerfile(dockerfile)
 
             # The result is saved as a build step
@@ -1,3 +1,5 @@
+import functools
+
 from fractale.agent.prompts import Prompt
 import fractale.agent.defaults as defaults
 
@@ -47,12 +49,28 @@ rebuild_prompt = {
 }
 
 
+# Stand-in for the error message, which changes with every rebuild attempt
+instruction_placeholder = "<<FRACTALE_INSTRUCTION>>"
+
+
+@functools.lru_cache(maxsize=256)
+def render_rebuild_prompt(details):
+    """
+    Render the rebuild prompt once per set of user details.
+    """
+    return Prompt(rebuild_prompt, {"details": details}).render(
+        {"instruction": instruction_placeholder}
+    )
+
+
 def get_rebuild_prompt(context):
     """
     The rebuild prompt will either be the entire error output, or the parsed error
     output with help from the agent manager.
     """
-    return Prompt(rebuild_prompt, context).render({"instruction": context.error_message})
+    # The task is trimmed on render, so we do the same for the instruction.
+    prompt = render_rebuild_prompt(context.get("details"))
+    return prompt.replace(instruction_placeholder, context.error_message.rstrip(), 1)
 
 
 build_instructions = [
@@ -73,9 +91,18 @@ generate_prompt = {
 }
 
 
+@functools.lru_cache(maxsize=256)
+def render_build_prompt(application, environment, details):
+    """
+    Render the build prompt. This only depends on a few stable strings,
+    so we cache it across build attempts.
+    """
+    return Prompt(generate_prompt, {"details": details}).render(
+        {"application": application, "environment": environment}
+    )
+
+
 def get_build_prompt(context):
     environment = context.get("environment", defaults.environment)
     application = context.get("application", required=True)
-    return Prompt(generate_prompt, context).render(
-        {"application": application, "environment": environment}
-    )
+    return render_build_prompt(application, environment, context.get("details"))
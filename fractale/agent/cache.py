@@ -0,0 +1,76 @@
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+
+# Set to a database path (or 1 for the default) to cache LLM responses
+cache_envar = "FRACTALE_LLM_CACHE"
+default_cache_path = os.path.join(os.path.expanduser("~"), ".fractale", "llmcache.db")
+
+
+class LLMCache:
+    """
+    A response cache for LLM requests, keyed by the model and exact prompt.
+
+    This lets repeated steps of a workflow (e.g., the same build or manifest
+    request) skip the request entirely. It is stored in sqlite so it can be
+    shared by agents (and processes) safely.
+
+    We keep the text the agent used. For a streamed response that was read only
+    up to the end of a code block, that is the truncated text (and we have no
+    token count for it), which is also what the chat history keeps.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, content TEXT NOT NULL, tokens INTEGER)"
+            )
+
+    def key(self, model, prompt, history=None):
+        """
+        Derive a key from the model, any prior conversation, and the prompt.
+        """
+        digest = hashlib.sha256(model.encode("utf-8"))
+        for text in history or []:
+            digest.update(b"\0" + text.encode("utf-8"))
+        digest.update(b"\0\0" + prompt.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """
+        Get a cached response, or None.
+        """
+        with self.lock:
+            row = self.db.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            return row[0]
+
+    def set(self, key, content, tokens=None):
+        """
+        Save a response to the cache.
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, content, tokens) VALUES (?, ?, ?)",
+                (key, content, tokens),
+            )
+
+
+@functools.lru_cache(maxsize=1)
+def get_cache():
+    """
+    Get the LLM cache, if it is enabled in the environment.
+    """
+    path = os.environ.get(cache_envar)
+    if not path:
+        return
+    return LLMCache(None if path == "1" else path)
@@ -1,6 +1,4 @@
-import collections
-
-import fractale.agent.logger as logger
+import collections.abc
 
 
 def get_context(context):
@@ -12,7 +10,7 @@ def get_context(context):
     return Context(context)
 
 
-class Context(collections.UserDict):
+class Context(collections.abc.MutableMapping):
     """
     A custom dictionary that allows attribute-style access to keys,
     and extends the 'get' method with a 'required' argument.
@@ -20,10 +18,17 @@ class Context(collections.UserDict):
     The context for an agent should be populated with metadata that
     needs to move between agents. The manager decides what from the
     context to pass to agents for an updated context.
+
+    Keys are held in a plain dict (data), and the common accessors go
+    straight to it instead of through the generic mapping mixins.
     """
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
+    __slots__ = ("data",)
+
+    def __init__(self, data=None, **kwargs):
+        if isinstance(data, Context):
+            data = data.data
+        self.data = dict(data or {}, **kwargs)
 
     def reset(self):
         """
@@ -36,52 +41,61 @@ class Context(collections.UserDict):
         """
         Is the context being managed?
         """
-        return self.get("managed") is True
+        return self.data.get("managed") is True
 
-    def __getattribute__(self, name):
+    def get(self, key, default=None, required=False):
         """
-        Intercepts all attribute lookups (including methods/functions)
+        Wrapper for the standard dict.get() method.
+        Accepts the custom 'required' argument.
         """
-        try:
-            # Step 1: this would be a normal attribute
-            attr = object.__getattribute__(self, name)
-        except AttributeError:
-            # Then handle lookup of dict key by attribute
-            return super().__getattribute__(name)
-
-        # Step 2: We allow "get" to be called with defaults / required.
-        if name == "get":
-            original_get = attr
-
-            def custom_get(key, default=None, required=False):
-                """
-                Wrapper for the standard dict.get() method.
-                Accepts the custom 'required' argument.
-                """
-                if required:
-                    if key not in self.data:
-                        raise ValueError(f"Key `{key}` is required but missing")
-                        logger.exit(f"Key `{key}` is required but missing", title="Context Status")
-
-                    # If required and found, just return the value
-                    return self.data[key]
-                else:
-                    # If not required, use the original dict.get behavior
-                    return original_get(key, default)
-
-            # Return the wrapper function instead of the original method
-            return custom_get
-
-        # 4. For any other attribute (like keys(), items(), update(), or custom methods)
-        # return the attribute we found earlier
-        return attr
-
-    # 5. Override __getattr__ to handle attribute-style access to dictionary keys
+        if required:
+            if key not in self.data:
+                raise ValueError(f"Key `{key}` is required but missing")
+
+            # If required and found, just return the value
+            return self.data[key]
+
+        # If not required, use the original dict.get behavior
+        return self.data.get(key, default)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+    def __delitem__(self, key):
+        del self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.data)
+
+    def keys(self):
+        return self.data.keys()
+
+    def items(self):
+        return self.data.items()
+
+    def values(self):
+        return self.data.values()
+
     def __getattr__(self, name):
         """
         Allows access to dictionary keys as attributes.
+
+        This is only called when normal attribute lookup fails. We guard "data"
+        so a partially constructed object (e.g., during copy) cannot recurse.
         """
-        if name in self.data:
+        if name != "data" and name in self.data:
             return self.data[name]
         raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
@@ -89,9 +103,9 @@ class Context(collections.UserDict):
         """
         Allows setting keys via attribute assignment.
         """
-        # If the attribute name is a reserved name (like 'data'), set it normally
-        if name in ("data", "_data"):
-            super().__setattr__(name, value)
+        # The data slot is set normally
+        if name == "data":
+            object.__setattr__(self, name, value)
 
         # Otherwise, treat it as a dictionary key
         else:
@@ -37,18 +37,16 @@ def timed(func):
     Timed decorator that adds timed executions for different functions
     """
 
+    # The metadata key only depends on the function, so we derive it once
+    name = f"{func.__name__}_seconds"
+
     @functools.wraps(func)
     def wrapper(self, *args, **kwargs):
 
         # This is the original function
         start = time.perf_counter()
         result = func(self, *args, **kwargs)
-        end = time.perf_counter()
-        elapsed_time = end - start
-        name = f"{func.__name__}_seconds"
-        if name not in self.metadata["times"]:
-            self.metadata["times"][name] = []
-        self.metadata["times"][name].append(elapsed_time)
+        self.metadata["times"].setdefault(name, []).append(time.perf_counter() - start)
         return result
 
     return wrapper
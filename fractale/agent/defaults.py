@@ -1,6 +1,16 @@
 environment = "generic cloud environment"
 gemini_model = "gemini-2.5-pro"
 
+# Concurrent requests when asking Gemini for many independent prompts
+gemini_batch_workers = 8
+
+# Gemini does not cache content under this many tokens (the minimum for 2.5 pro)
+gemini_cache_min_tokens = 4096
+
+# Seconds between polls when waiting on a deploy (backing off to the max)
+poll_interval = 1
+poll_max_interval = 10
+
 # These are common / default args we don't need to give in any prompt.
 shared_args = {
     "command",
@@ -10,6 +20,8 @@ shared_args = {
     "incremental",
     "outfile",
     "plan",
+    "poll_interval",
+    "poll_max_interval",
     "quiet",
     "result",
     "results",
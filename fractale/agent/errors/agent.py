@@ -1,3 +1,4 @@
+import hashlib
 import textwrap
 
 from rich import print
@@ -24,13 +25,27 @@ class DebugAgent(GeminiAgent):
         # Debug agents are usually ephemeral, but if not used like that, keep record
         self.metadata["assets"]["counts"] = {"return_to_manager": 0, "return_to_human": 0}
 
+    def init(self):
+        """
+        The static part of the debug prompt is provided as the system instruction.
+        We don't use the default model (or its chat) from the parent.
+        """
+        self.model = self.get_cached_model(prompts.static_debug_prefix)
+        self.chat = self.model.start_chat()
+
     def get_prompt(self, context, requires=None):
         """
         Get the prompt for the LLM. We expose this so the manager can take it
         and tweak it.
         """
         context = get_context(context)
-        return prompts.get_debug_prompt(context, requires=requires)
+        memory_pack = prompts.get_memory_pack(context)
+
+        # A version for the stable context, so we can tell when it changed. This is
+        # our metadata, and not added to the context (which other agents use in prompts)
+        version = hashlib.md5(memory_pack.encode("utf-8")).hexdigest()
+        self.metadata["memory_pack_version"] = version
+        return prompts.get_debug_prompt(context, requires=requires, memory_pack=memory_pack)
 
     def run(self, context, requires=None):
         """
@@ -1,40 +1,60 @@
+from jinja2 import Template
+
 import fractale.agent.defaults as defaults
-from fractale.agent.prompts import Prompt
 
 persona = "You are a debugging agent and expert."
 context = "We attempted the following piece of code and had problems."
-debug_task = """Please identify the error and advise for how to fix it. The agent you are returning to can only make scoped changes, which we provide below. {% if return_to_manager %}If you determine the issue cannot be resolved by changing one of these files, we will need to return to another agent. In this case, please provide "RETURN TO MANAGER" anywhere in your response.{% endif %}
+
+# The static part of the debug prompt is given as the system instruction, and
+# comes first so the provider can cache it across debugging calls.
+debug_system_task = "Please identify the error and advise for how to fix it. The agent you are returning to can only make scoped changes, which we provide below."
+static_debug_prefix = f"{persona}\n{context}\n{debug_system_task}"
+
+# Context keys we do not list for the debug agent (details are added last)
+skip_keys = defaults.shared_args | {"details"}
+
+# The dynamic part of the prompt is sent with each request.
+debug_task = """{% if return_to_manager %}If you determine the issue cannot be resolved by changing one of these files, we will need to return to another agent. In this case, please provide "RETURN TO MANAGER" anywhere in your response.{% endif %}
 {% if return_to_human %}If you would like a human to add comment to how to address the issue, put "RETURN TO HUMAN" anywhere in your response and include any questions you have about the issue. You can ONLY choose one source of help.{% endif %}
 {% if requires %}{% for item in requires %}  - {{item}}\n{% endfor %}{% endif %}
 Here is additional context to guide your instruction. YOU CANNOT CHANGE THESE VARIABLES OR FILES OR SUGGEST TO DO SO.
   {{ context }}
 Here is the code:\n{{code_block}}\nAnd here is the error output:\n{{error_message}}
 """
+debug_template = Template(debug_task)
+
 
-debug_prompt = {
-    "persona": persona,
-    "context": context,
-    "task": debug_task,
-    "instructions": [],
-}
+def get_memory_pack(context):
+    """
+    Get the stable context we list for the debug agent (without user details).
+
+    Keys are sorted so the same context always gives the same prompt (and
+    provider prefix caches can hit).
+    """
+    return "".join(
+        [
+            f"{key} is defined as: {context[key]}\n"
+            for key in sorted(context)
+            if key not in skip_keys
+        ]
+    )
 
 
-def get_debug_prompt(context, requires):
+def get_debug_prompt(context, requires, memory_pack=None):
     """
     Since this is called by an agent, we can directly include requires as a param.
-    (and not put it in the context).
+    (and not put it in the context). This is only the dynamic part of the prompt,
+    and the agent provides static_debug_prefix as the system instruction.
     """
     error_message = context.get("error_message", required=True)
     code_block = context.get("result", required=True)
 
-    # Prepare additional context
-    additional_context = ""
-    for key, value in context.items():
-        if key in defaults.shared_args:
-            continue
-        if key == "details":
-            key = "details from user"
-        additional_context += f"{key} is defined as: {value}\n"
+    # Prepare additional context. User details come after.
+    additional_context = memory_pack if memory_pack is not None else get_memory_pack(context)
+    if "details" in context:
+        additional_context = (
+            f"{additional_context}details from user is defined as: {context['details']}\n"
+        )
 
     # Fine grained control of return to manager or human
     return_to_manager = (
@@ -46,14 +66,13 @@ def get_debug_prompt(context, requires):
         and context.get("allow_return_to_human") is not False
     )
 
-    return Prompt(debug_prompt, context).render(
-        {
-            "error_message": error_message,
-            # Return to manager MUST be False
-            "return_to_manager": return_to_manager,
-            "return_to_human": return_to_human,
-            "requires": requires,
-            "context": additional_context,
-            "code_block": code_block,
-        }
+    prompt = debug_template.render(
+        error_message=error_message,
+        # Return to manager MUST be False
+        return_to_manager=return_to_manager,
+        return_to_human=return_to_human,
+        requires=requires,
+        context=additional_context,
+        code_block=code_block,
     )
+    return prompt.strip()
@@ -1,15 +1,13 @@
 import argparse
+import collections
+import concurrent.futures
 import os
-import shutil
 import subprocess
-import sys
 import tempfile
 import textwrap
 
-import google.generativeai as genai
 from rich import print
 
-import fractale.agent.defaults as defaults
 import fractale.agent.flux.batch.prompts as prompts
 import fractale.agent.logger as logger
 import fractale.utils as utils
@@ -18,6 +16,15 @@ from fractale.agent.context import get_context
 from fractale.agent.decorators import timed
 from fractale.agent.errors import DebugAgent
 
+# Lines of validation output we keep (the tail is what the debug agent needs)
+validate_log_lines = 2000
+
+# Added (once) when a response could not be validated at all
+bash_reminder = "\nYou MUST return the variables back as a bash script"
+
+# Write the script to be validated in memory (tmpfs) when we can
+tmpfs_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
 
 class FluxBatchAgent(GeminiAgent):
     """
@@ -31,12 +38,7 @@ class FluxBatchAgent(GeminiAgent):
     state_variables = ["instruction"]
 
     def init(self):
-        self.model = genai.GenerativeModel(defaults.gemini_model)
-        self.chat = self.model.start_chat()
-        try:
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        except KeyError:
-            sys.exit("ERROR: GEMINI_API_KEY environment variable not set.")
+        super().init()
         self.metadata["generation_attempts"] = 0
 
     def _add_arguments(self, subparser):
@@ -52,70 +54,124 @@ class FluxBatchAgent(GeminiAgent):
         return agent
 
     @timed
-    def run(self, context, prompt=None):
+    def run(self, context, prompt=None, response=None):
         """
         Run the optimization agent.
 
-        Additional text can reset each time.
+        Additional text can reset each time. A response we already have for the
+        prompt (e.g., from run_many) is used for the first attempt.
         """
         # We don't do attempts because we have no condition for success.
         context = get_context(context)
         prompt = prompt or prompts.get_generate_prompt(context)
-        self.metadata["generation_attempts"] += 1
-
-        # validator.parse(jobspec)
 
-        print("Sending jobspec request prompt to Gemini...")
-        print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
+        # Retry in a loop (not recursion) so many attempts do not grow the stack
+        while True:
+            self.metadata["generation_attempts"] += 1
+
+            if response is None:
+                print("Sending jobspec request prompt to Gemini...")
+                print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
+                response = self.ask_gemini(prompt, with_history=True)
+                print("Received jobspec from Gemini...")
+            content, response = response, None
+            logger.custom(content, title="[green]Result Parser[/green]", border_style="green")
+            try:
+                result = self.get_code_block(content, "bash")
+                return_code, output = self.validate(context, result)
+            except Exception as e:
+                # This still counts as an attempt, so bad output cannot loop forever
+                context.error_message = (
+                    f"The response could not be validated as a batch script: {e}"
+                )
+                if self.reached_max_attempts():
+                    return self.give_up(context)
+                self.attempts += 1
+                if not prompt.endswith(bash_reminder):
+                    prompt += bash_reminder
+                continue
 
-        content = self.ask_gemini(prompt, with_history=True)
-        print("Received jobspec from Gemini...")
-        logger.custom(content, title="[green]Result Parser[/green]", border_style="green")
-        try:
-            result = self.get_code_block(content, "bash")
-            return_code, output = self.validate(context, result)
             context.result = output
             if return_code == 0:
                 self.print_result(context.result)
                 logger.success(f"Valid Flux Batch Job in {self.attempts} attempts")
-            else:
-                logger.error(f"Validation failed:\n{output}")
+                return context
 
-                # Get DebugAgent insights!
-                print("\n[bold cyan] Requesting Correction from Debug Agent[/bold cyan]")
-                context.error_message = output
-                context = DebugAgent().run(context, requires=[output])
+            logger.error(f"Validation failed:\n{output}")
 
-                # If we have reached the max attempts...
-                if self.reached_max_attempts() or context.get("return_to_manager") is True:
-                    context.return_to_manager = False
+            # Get DebugAgent insights!
+            print("\n[bold cyan] Requesting Correction from Debug Agent[/bold cyan]")
+            context.error_message = output
+            context = DebugAgent().run(context, requires=[output])
 
-                    # If we are being managed, return the result
-                    if context.is_managed():
-                        context.return_code = -1
-                        context.result = context.error_message
-                        return context
+            # If we have reached the max attempts...
+            if self.reached_max_attempts() or context.get("return_to_manager") is True:
+                return self.give_up(context)
 
-                    # Otherwise this is a failure state
-                    logger.exit(f"Max attempts {self.max_attempts} reached.", title="Agent Failure")
+            # If we get here, invalid and we need to try again with a fresh prompt
+            self.attempts += 1
+            prompt = prompts.get_generate_prompt(context)
 
-                # If we get here, invalid and we need to try again
-                self.attempts += 1
-                return self.run(context)
+    def give_up(self, context):
+        """
+        Stop trying. A managed run returns the error to the manager, otherwise we exit.
+        """
+        context.return_to_manager = False
+
+        # If we are being managed, return the result
+        if context.is_managed():
+            context.return_code = -1
+            context.result = context.error_message
+            return context
+
+        # Otherwise this is a failure state
+        logger.exit(f"Max attempts {self.max_attempts} reached.", title="Agent Failure")
 
-        except:
-            prompt += "\nYou MUST return the variables back as a bash script"
-            return self.run(context, prompt)
+    def run_many(self, contexts):
+        """
+        Run independent contexts at once, and return their final contexts.
 
-        # If we get here, we had success and return
-        return context
+        Like the base run_many, each context gets a new agent and runs on its own
+        thread. The first generation for every context is requested together, and
+        each agent starts from that response (validating it, and going through
+        the debug loop if it fails).
+        """
+        if not contexts:
+            return []
+        contexts = [get_context(context) for context in contexts]
+        generate_prompts = [prompts.get_generate_prompt(context) for context in contexts]
+        responses = self.ask_gemini_batch(generate_prompts)
+
+        agents = []
+        for prompt, response in zip(generate_prompts, responses):
+            agent = self.new_agent()
+
+            # The chat continues from the batch request, as if this agent had asked
+            agent.chat.history = [
+                {"role": "user", "parts": [prompt]},
+                {"role": "model", "parts": [response]},
+            ]
+            agents.append(agent)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(contexts)) as executor:
+            futures = [
+                agent.run_async(context, executor, prompt=prompt, response=response)
+                for agent, context, prompt, response in zip(
+                    agents, contexts, generate_prompts, responses
+                )
+            ]
+            results = [future.result() for future in futures]
+
+        for agent in agents:
+            self.metadata["generation_attempts"] += agent.metadata["generation_attempts"]
+        return results
 
     def validate(self, context, content):
         """
         Validate a generated Flux batch script.
         """
         container = context.get("container", default="ghcr.io/compspec/fractale:flux-validator")
-        validate_dir = tempfile.mkdtemp()
+        validate_dir = tempfile.mkdtemp(dir=tmpfs_dir)
         batch_script = os.path.join(validate_dir, "batch.sh")
         utils.write_file(content, batch_script)
         utils.make_executable(batch_script)
@@ -132,13 +188,25 @@ class FluxBatchAgent(GeminiAgent):
             container,
             "/data/batch.sh",
         ]
-        p = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=validate_dir,
-            check=False,
-        )
-        # Clean up after we finish
-        shutil.rmtree(validate_dir, ignore_errors=True)
-        return (p.returncode, p.stdout + p.stderr)
+        from rich.console import Console
+        from rich.markup import escape
+
+        # Stream output as it comes, and only keep the tail for the debug agent
+        tail = collections.deque(maxlen=validate_log_lines)
+        with Console().status("[dim]Validating...[/dim]") as status:
+            with subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=validate_dir,
+                text=True,
+                errors="replace",
+                bufsize=1,
+            ) as proc:
+                for line in proc.stdout:
+                    tail.append(line)
+                    status.update(f"[dim]{escape(line.strip()[:120])}[/dim]")
+
+        # Clean up after we finish (in the background)
+        utils.remove_later(validate_dir)
+        return (proc.returncode, "".join(tail))
@@ -1,13 +1,58 @@
 import argparse
+import copy
+import functools
 import json
 import subprocess
 
+import yaml
 from rich import print
 from rich.panel import Panel
-from rich.syntax import Syntax
 
+import fractale.agent.defaults as defaults
 import fractale.agent.logger as logger
 from fractale.agent.base import GeminiAgent
+from fractale.utils.fileio import SafeDumper, SafeLoader
+
+
+@functools.lru_cache(maxsize=16)
+def load_manifest(content):
+    return yaml.load(content, Loader=SafeLoader)
+
+
+def parse_manifest(content):
+    """
+    Parse a manifest, skipping the parse when retries give back the same text.
+    We return a copy, since callers update the manifest in place.
+    """
+    return copy.deepcopy(load_manifest(content))
+
+
+def dump_manifest(data):
+    """
+    Dump a manifest back to yaml, keeping the order of the fields.
+    """
+    return yaml.dump(data, Dumper=SafeDumper, sort_keys=False)
+
+
+def replaces_manifest(manifest, update):
+    """
+    Determine if an update is a complete manifest that can replace the current one.
+
+    It must parse, have the same apiVersion and kind, and include metadata and a
+    spec. Anything else (e.g., a pod spec or a set of resources) is a fragment,
+    and we can't tell where its fields go.
+    """
+    try:
+        data = load_manifest(manifest)
+        update = load_manifest(update)
+    except yaml.YAMLError:
+        return False
+    if not isinstance(data, dict) or not isinstance(update, dict):
+        return False
+    for key in ["apiVersion", "kind"]:
+        if not update.get(key) or update.get(key) != data.get(key):
+            return False
+    return bool(update.get("metadata")) and bool(update.get("spec"))
 
 
 class KubernetesAgent(GeminiAgent):
@@ -15,6 +60,9 @@ class KubernetesAgent(GeminiAgent):
     A Kubernetes agent is a base class for a generic Kubernetes agent.
     """
 
+    # Always ask the LLM to apply optimization updates, even a complete manifest
+    use_llm_merge = False
+
     def _add_arguments(self, subparser):
         """
         Add arguments for the plugin to show up in argparse
@@ -38,6 +86,16 @@ class KubernetesAgent(GeminiAgent):
             action="store_true",
             help="Do not pull the image, assume pull policy is Never",
         )
+        agent.add_argument(
+            "--poll-interval",
+            type=float,
+            help=f"Seconds to first wait between deploy status checks (defaults to {defaults.poll_interval})",
+        )
+        agent.add_argument(
+            "--poll-max-interval",
+            type=float,
+            help=f"Maximum seconds to wait between deploy status checks (defaults to {defaults.poll_max_interval})",
+        )
         agent.add_argument("--context-file", help="Context from a deploy failure or similar.")
         return agent
 
@@ -45,6 +103,9 @@ class KubernetesAgent(GeminiAgent):
         """
         Print Job CRD with highlighted Syntax
         """
+        # Syntax pulls in pygments, so we only import it when needed
+        from rich.syntax import Syntax
+
         highlighted_syntax = Syntax(job_crd, "yaml", theme="monokai", line_numbers=True)
         logger.custom(
             highlighted_syntax, title="Final Kubernetes Job", border_style="green", expand=True
@@ -55,26 +116,37 @@ class KubernetesAgent(GeminiAgent):
         Save logs to metadata
         """
         if self.save_incremental:
-            if "logs" not in self.metadata["assets"]:
-                self.metadata["assets"]["logs"] = []
-            self.metadata["assets"]["logs"].append({"item": full_logs, "attempt": self.attempts})
+            self.save_asset("logs", full_logs)
 
     def save_job_manifest(self, job):
         """
         Save job manifest to metadata
         """
         if self.save_incremental:
-            if self.result_type not in self.metadata["assets"]:
-                self.metadata["assets"][self.result_type] = []
-            self.metadata["assets"][self.result_type].append(
-                {"item": job, "attempt": self.attempts}
-            )
+            self.save_asset(self.result_type, job)
 
     def cluster_resources(self):
         """
         Get cluster resources - count of nodes and resources.
-        I was thinking of caching this, but clusters can change,
-        and it's easy (and inexpensive) enough to query that we repeat.
+
+        The nodes don't change between optimization retries, so we keep the
+        result until invalidate_cluster_resources is called. A failed query
+        is not kept, so we try again next time.
+        """
+        resources = getattr(self, "_cluster_resources", None)
+        if resources is None:
+            resources = self._cluster_resources = self.query_cluster_resources()
+        return resources
+
+    def invalidate_cluster_resources(self):
+        """
+        Forget the cluster resources, e.g., if nodes were added or removed.
+        """
+        self._cluster_resources = None
+
+    def query_cluster_resources(self):
+        """
+        Query the cluster for the count of nodes and resources.
         """
         print("[yellow]Querying Kubernetes cluster for node resources...[/yellow]")
         try:
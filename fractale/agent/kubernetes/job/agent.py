@@ -1,15 +1,13 @@
-import copy
+import concurrent.futures
 import json
 import os
-import shutil
 import sys
-import tempfile
 import textwrap
 import time
 
-import yaml
 from rich import print
 
+import fractale.agent.defaults as defaults
 import fractale.agent.kubernetes.job.prompts as prompts
 import fractale.agent.kubernetes.objects as objects
 import fractale.agent.logger as logger
@@ -17,7 +15,12 @@ import fractale.utils as utils
 from fractale.agent.context import get_context
 from fractale.agent.decorators import timed
 from fractale.agent.errors import DebugAgent
-from fractale.agent.kubernetes.base import KubernetesAgent
+from fractale.agent.kubernetes.base import (
+    KubernetesAgent,
+    dump_manifest,
+    parse_manifest,
+    replaces_manifest,
+)
 from fractale.agent.optimize import OptimizationAgent
 from fractale.agent.scaling import ScalingAgent
 
@@ -70,27 +73,35 @@ class KubernetesJobAgent(KubernetesAgent):
         """
         Run the agent.
         """
-        # These are required, context file is not (but recommended)
-        context = self.add_build_context(context)
-        self.validate(context)
-
-        # This will either generate fresh or rebuild erroneous Job
-        manifest = self.generate_manifest(context)
-        logger.custom(manifest, title=f"[green]{self.name}.yaml[/green]", border_style="green")
-
-        # Make and deploy it! Success is exit code 0.
-        return_code, output = self.deploy(context)
-        if return_code == 0:
-            self.print_result(manifest)
-            logger.success(f"Deploy complete in {self.attempts} attempts")
-        else:
-            return self.handle_failed_job(context, output, manifest)
+        # Each failed attempt loops back here with the error message.
+        while True:
+
+            # These are required, context file is not (but recommended)
+            context = self.add_build_context(context)
+            self.validate(context)
+
+            # This will either generate fresh or rebuild erroneous Job
+            manifest = self.generate_manifest(context)
+            logger.custom(manifest, title=f"[green]{self.name}.yaml[/green]", border_style="green")
+
+            # Make and deploy it! Success is exit code 0.
+            return_code, output = self.deploy(context)
+            if return_code == 0:
+                break
+            context, retry = self.handle_failed_job(context, output, manifest)
+            if not retry:
+                return context
+
+        self.print_result(manifest)
+        logger.success(f"Deploy complete in {self.attempts} attempts")
         self.write_file(context, manifest)
         return context
 
     def handle_failed_job(self, context, output, manifest):
         """
         Handle a failed job
+
+        Returns the updated context, and if we should try again.
         """
         logger.error(f"Deploy failed or lost:\n{output[-1000:]}", title="Deploy Status")
         print(
@@ -114,7 +125,7 @@ class KubernetesJobAgent(KubernetesAgent):
             if context.is_managed():
                 context.return_code = -1
                 context.result = context.error_message
-                return context
+                return context, False
 
             # Otherwise this is a failure state
             logger.exit(f"Max attempts {self.max_attempts} reached.", title="Agent Failure")
@@ -124,7 +135,7 @@ class KubernetesJobAgent(KubernetesAgent):
         # Trigger again, provide initial context and error message
         # This is the internal loop running, no manager agent
         context.result = manifest
-        return self.run_step(context)
+        return context, True
 
     def add_build_context(self, context):
         """
@@ -138,32 +149,40 @@ class KubernetesJobAgent(KubernetesAgent):
             context.dockerfile = utils.read_file(build_context)
         return context
 
-    def get_diagnostics(self, obj, pod):
+    def get_diagnostics(self, obj, pod, job_status=None, pod_status=None):
         """
         Helper to collect error data for a failed job.
+
+        Status we already have (e.g., from the polling loop) can be provided.
+        Status and events for the job and pod are each one kubectl query, and
+        we run them (and getting logs) together.
         """
-        pod_events = []
-        pods_description = ""
+        objs = [obj] if pod is None else [obj, pod]
+        need_status = job_status is None or (pod is not None and pod_status is None)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            if need_status:
+                statuses = executor.submit(objects.get_object_statuses, *objs)
+            events = executor.submit(objects.get_object_events, *objs)
+
+            # This is assumed to be a one shot
+            logs = executor.submit(obj.get_logs, wait=False)
+
+        if need_status:
+            found = statuses.result()
+            job_status = found[0] if job_status is None else job_status
+            if pod is not None and pod_status is None:
+                pod_status = found[1]
+
+        pod_description = None
         if pod is not None:
-            pod_status = pod.get_filtered_status()
-            pod_events = pod.get_events()
-            pods_description = json.dumps(pod_status)
-
-        job_status = obj.get_filtered_status()
-
-        # Use json.dumps because it's more compact (maybe fewer tokens)
-        job_events = obj.get_events()
-        events = sorted(job_events + pod_events, key=lambda e: e.get("lastTimestamp", ""))
-        job_description = json.dumps(job_status)
-        events_description = json.dumps(events)
+            pod_description = pod.get_filtered_status(pod_status)
+        full_logs, _ = logs.result()
 
-        # This is assumed to be a one shot
-        full_logs, _ = obj.get_logs(wait=False)
-
-        # Get job and pod events, add lgs if we have them.
-        diagnostics = prompts.meta_bundle % (job_description, pods_description, events_description)
-        if full_logs:
-            return diagnostics + full_logs
+        # Get job and pod events, add logs if we have them.
+        diagnostics, version = prompts.build_diagnostics_pack(
+            obj.get_filtered_status(job_status), pod_description, events.result(), full_logs
+        )
+        self.metadata["diagnostics_version"] = version
         return diagnostics
 
     @timed
@@ -177,7 +196,7 @@ class KubernetesJobAgent(KubernetesAgent):
 
         # Job needs to load as yaml to work, period.
         try:
-            job_data = yaml.safe_load(context.result)
+            job_data = parse_manifest(context.result)
         except Exception as e:
             return (1, str(e) + "\n" + context.result)
 
@@ -188,12 +207,13 @@ class KubernetesJobAgent(KubernetesAgent):
             return 1, "Generated YAML is missing required '.metadata.name' field."
 
         # If it doesn't follow instructions...
-        job_data, return_code, message = self.check(context, job_data)
+        updated, return_code, message = self.check(context, job_data)
         if return_code != 0:
             return return_code, message
-        context.result = yaml.dump(job_data)
-        deploy_dir = tempfile.mkdtemp()
-        print(f"[dim]Created temporary deploy context: {deploy_dir}[/dim]")
+
+        # The text we parsed is still correct unless check changed it
+        if updated:
+            context.result = dump_manifest(job_data)
 
         # Create job objects (and eventually pod)
         # But ensure we delete any that might exist from before.
@@ -211,9 +231,9 @@ class KubernetesJobAgent(KubernetesAgent):
 
         # 2. We then need to wait until the job is running or fails
         print("[yellow]Waiting for Job to start... (Timeout: 5 minutes)[/yellow]")
-        return self.finish_deploy(context, job, deploy_dir)
+        return self.finish_deploy(context, job)
 
-    def finish_deploy(self, context, obj, deploy_dir, callback=None):
+    def finish_deploy(self, context, obj, callback=None):
         """
         Watch for pod / job object and finish deployment.
         """
@@ -226,110 +246,128 @@ class KubernetesJobAgent(KubernetesAgent):
 
         # This assumes a backoff / retry of 1, so we aren't doing recreation
         # If it fails once, it fails once and for all.
-        # 30 * 5s = 150s (2.5 minutes!)
-        for i in range(30):
-
-            # 1. Check the parent Job's status for a quick terminal state
-            status = obj.get_status()
-            if status and status.get("succeeded", 0) > 0:
-                # The job is done, try to get logs and report success
-                print("[green]✅ MiniCluster Job has Succeeded.[/green]")
-                break
-
-            # Womp womp
-            if status.get("failed", 0) > 0:
-                logger.error("Job reports Failed.", title="Job Status")
-                diagnostics = self.get_diagnostics(obj, pod)
-                cleanup(callback, obj)
-                return (
-                    1,
-                    f"Job entered failed state. This usually happens after repeated pod failures.\n\n{diagnostics}",
-                )
+        # We check with backoff for up to 150s (2.5 minutes!), but also wake up
+        # as soon as a watch sees the job or a pod for it change.
+        # The intervals can be tuned in the context (e.g., for slow image pulls)
+        initial = context.get("poll_interval") or defaults.poll_interval
+        maximum = context.get("poll_max_interval") or defaults.poll_max_interval
+        with obj.watch() as job_watcher, obj.watch_pods(events=job_watcher.events) as watcher:
+            poll = objects.backoff(timeout=150, initial=initial, maximum=maximum, wait=watcher.wait)
+            for i in poll:
+
+                # 1. Find the pod. It may not exist yet, in which case we look
+                # again on the next tick of the backoff.
+                if not pod:
+                    # The watch gives us the name if it has seen one
+                    if watcher.latest:
+                        pod = objects.KubernetesPod(watcher.latest, obj.namespace)
+                    else:
+                        pod = obj.get_pod()
+
+                # 2. Get the Job (and pod) status. The watches keep the latest, and
+                # we only query (once for both) when they have not seen them.
+                status = job_watcher.get_status(obj.name)
+                pod_status = watcher.get_status(pod.name) if pod else None
+                if status is None or (pod and pod_status is None):
+                    if pod:
+                        status, pod_status = objects.get_object_statuses(obj, pod)
+                    else:
+                        status = obj.get_status()
+
+                # Check the parent Job's status for a quick terminal state
+                if status and status.get("succeeded", 0) > 0:
+                    # The job is done, try to get logs and report success
+                    print("[green]✅ MiniCluster Job has Succeeded.[/green]")
+                    break
+
+                # Womp womp
+                if status.get("failed", 0) > 0:
+                    logger.error("Job reports Failed.", title="Job Status")
+                    diagnostics = self.get_diagnostics(
+                        obj, pod, job_status=status, pod_status=pod_status
+                    )
+                    cleanup(callback, obj)
+                    return (
+                        1,
+                        f"Job entered failed state. This usually happens after repeated pod failures.\n\n{diagnostics}",
+                    )
 
-            # 2. If the job isn't terminal, find the pod. It may not exist yet.
-            tries = 0
-            while not pod and tries < 10:
-                print("Waiting for pod...", end="\r")
-                pod = obj.get_pod()
-                time.sleep(5)
-                tries += 1
-
-            # 3. If a pod exists, inspect it deeply for fatal errors or readiness.
-            if pod:
-                pod_info = pod.get_info()
-                if pod_info:
-                    pod_status = pod_info.get("status", {})
-                    pod_phase = pod_status.get("phase")
-
-                    # If the pod is running and its containers are ready, we can log.
-                    # Note that after we add init containers, this will need tweaking
-                    if pod_phase == "Running":
-                        container_statuses = pod_status.get("containerStatuses", [])
-                        if all(cs.get("ready") for cs in container_statuses):
-                            print(f"[green]✅ Pod '{pod.name}' is Ready.[/green]")
+                # 3. If a pod exists, inspect it deeply for fatal errors or readiness.
+                # An existing pod always has a status (with at least the phase).
+                if pod:
+                    if pod_status:
+                        pod_phase = pod_status.get("phase")
+
+                        # If the pod is running and its containers are ready, we can log.
+                        # Note that after we add init containers, this will need tweaking
+                        if pod_phase == "Running":
+                            container_statuses = pod_status.get("containerStatuses", [])
+                            if all(cs.get("ready") for cs in container_statuses):
+                                print(f"[green]✅ Pod '{pod.name}' is Ready.[/green]")
+                                break
+
+                        # If the pod succeeded already, we can also proceed...
+                        if pod_phase == "Succeeded":
+                            print(f"[green]✅ Pod '{pod.name}' has Succeeded.[/green]")
                             break
 
-                    # If the pod succeeded already, we can also proceed...
-                    if pod_phase == "Succeeded":
-                        print(f"[green]✅ Pod '{pod.name}' has Succeeded.[/green]")
-                        break
+                        # This is important because a pod can be active, but then go into a crashed state
+                        # We provide the status that coincides with our info query to be consistent
+                        if reason := pod.has_failed_container(pod_status):
 
-                    # This is important because a pod can be active, but then go into a crashed state
-                    # We provide the status that coincides with our info query to be consistent
-                    if reason := pod.has_failed_container(pod_status):
+                            # If the pod was OOMKIlled, this shouldn't cycle around as failure during optimization
+                            if reason == "OOMKilled" and context.get("is_optimizing"):
+                                print(f"[orange]Pod '{pod.name}' was OOMKilled.[/orange]")
+                                cleanup(callback, obj)
+                                return self.optimize(
+                                    context, obj, context.result, "The last attempt was OOMKilled."
+                                )
 
-                        # If the pod was OOMKIlled, this shouldn't cycle around as failure during optimization
-                        if reason == "OOMKilled" and context.get("is_optimizing"):
-                            print(f"[orange]Pod '{pod.name}' was OOMKilled.[/orange]")
+                            diagnostics = self.get_diagnostics(
+                                obj, pod, job_status=status, pod_status=pod_status
+                            )
                             cleanup(callback, obj)
-                            return self.optimize(
-                                context, obj, context.result, "The last attempt was OOMKilled."
+                            return (
+                                1,
+                                f"Pod '{pod.name}' is stuck in a fatal state: {reason}\n\n{diagnostics}",
                             )
 
-                        diagnostics = self.get_diagnostics(obj, pod)
-                        cleanup(callback, obj)
-                        return (
-                            1,
-                            f"Pod '{pod.name}' is stuck in a fatal state: {reason}\n\n{diagnostics}",
+                        print(
+                            f"[dim]Job is active, Pod '{pod.name}' has status '{pod_phase}'. Waiting... ({i})[/dim]",
+                            end="\r",
                         )
 
-                    print(
-                        f"[dim]Job is active, Pod '{pod.name}' has status '{pod_phase}'. Waiting... ({i+1}/60)[/dim]",
-                        end="\r",
-                    )
+                    # This means we saw the pod name, but didn't get pod info / it disappeared - let loop continue
+                    else:
+                        print(
+                            f"[dim]Job is active, but Pod '{pod.name}' disappeared. Waiting for new pod... ({i})[/dim]",
+                            end="\r",
+                        )
+                        pod = None
 
-                # This means we saw the pod name, but didn't get pod info / it disappeared - let loop continue
+                # No pod yet, keep waiting.
                 else:
                     print(
-                        f"[dim]Job is active, but Pod '{pod.name}' disappeared. Waiting for new pod... ({i+1}/60)[/dim]",
+                        f"[dim]Job is active, but no pod found yet. Waiting... ({i})[/dim]",
                         end="\r",
                     )
-                    pod = None
 
-            # No pod yet, keep waiting.
+            # This gets hit when the loop is done, so we probably have a timeout
             else:
-                print(
-                    f"[dim]Job is active, but no pod found yet. Waiting... ({i+1}/60)[/dim]",
-                    end="\r",
+                diagnostics = self.get_diagnostics(obj, pod)
+                cleanup(callback, obj)
+                return (
+                    1,
+                    f"Timeout: Job did not reach a stable running or completed state within the time limit.\n\n{diagnostics}",
                 )
 
-            time.sleep(5)
-
-        # This gets hit when the loop is done, so we probably have a timeout
-        else:
-            cleanup(callback, obj)
-            diagnostics = self.get_diagnostics(obj, pod)
-            return (
-                1,
-                f"Timeout: Job did not reach a stable running or completed state within the time limit.\n\n{diagnostics}",
-            )
-
         # Let's try to stream logs!
         print("[green]🚀 Proceeding to stream logs...[/green]")
 
         # This function takes the max runtime and will stream until it passes, or the pod exits
         pod.wait_for_ready()
-        full_logs, was_timeout = obj.get_logs(context.get("max_runtime"))
+        scanner = objects.LogScanner("unsatisfiable")
+        full_logs, was_timeout = obj.get_logs(context.get("max_runtime"), scanner=scanner)
         context.was_timeout = was_timeout
         final_status = pod.wait_for_complete()
 
@@ -338,7 +376,7 @@ class KubernetesJobAgent(KubernetesAgent):
 
         # Save logs regardless of success or not (so we see change)
         self.save_log(full_logs)
-        context.was_unsatisfiable = "unsatisfiable" in full_logs
+        context.was_unsatisfiable = "unsatisfiable" in scanner
 
         # But did it succeed?
         to_optimizing = context.get("is_optimizing") is True
@@ -346,8 +384,11 @@ class KubernetesJobAgent(KubernetesAgent):
         print(f"To optimizing: {to_optimizing}")
         print(f"To scaling: {to_scaling}")
 
-        # Always get diagnostics in case we need, to cleanly clean up
-        diagnostics = self.get_diagnostics(obj, pod)
+        # Get diagnostics in case we need them, before we clean up. They are only
+        # used for a failure, and a success (e.g., every optimize step) skips them.
+        diagnostics = None
+        if final_status != "Succeeded":
+            diagnostics = self.get_diagnostics(obj, pod)
         cleanup(callback, obj)
 
         # Success case. Are we still scaling?
@@ -374,7 +415,7 @@ class KubernetesJobAgent(KubernetesAgent):
             if to_optimizing:
                 full_logs = prompts.lost_optimization_message % full_logs
                 return self.optimize(context, obj, context.result, full_logs)
-            return 1, prompts.lost_message % full_logs
+            return 1, prompts.lost_message % prompts.tail_logs(full_logs)
 
         # If we were optimizing and it was too long, return to optimization agent
         # Or we were optimizing and the resource was unsatisfiable
@@ -389,10 +430,6 @@ class KubernetesJobAgent(KubernetesAgent):
             # We already have the logs, so we can pass them directly.
             return 1, prompts.failure_message % diagnostics
 
-        if context.get("cleanup") is True and os.path.exists(deploy_dir):
-            print(f"[dim]Cleaning up temporary deploy directory: {deploy_dir}[/dim]")
-            shutil.rmtree(deploy_dir, ignore_errors=True)
-
         # Save full logs for the step
         return 0, full_logs
 
@@ -443,7 +480,7 @@ class KubernetesJobAgent(KubernetesAgent):
         # If we haven't cached the sizes
         extra = ""
         if "sizes" not in self.metadata["assets"]:
-            self.metadata["assets"]["sizes"] = copy.deepcopy(context.sizes)
+            self.metadata["assets"]["sizes"] = list(context.sizes)
             extra = "This is the first size of a scaling study."
             context.scaling_attempts = {}
 
@@ -455,11 +492,16 @@ class KubernetesJobAgent(KubernetesAgent):
         context.size = context.sizes.pop(0)
         decision = "RETRY"
         specs = {}
-        holder = copy.deepcopy(context.optimize)
+        holder = context.optimize
+        prompt_key = None
         while decision != "STOP":
 
             # We need to provide the optimization agent with a prompt that includes the size
-            context.optimize = f"You MUST optimize for {context.size} nodes.\n{extra}\n{holder}"
+            # It only changes with the size (or after the first note), so we build it once for each
+            if prompt_key != (context.size, extra):
+                prompt_key = (context.size, extra)
+                size_prompt = prompts.scale_optimize_message % (context.size, extra, holder)
+            context.optimize = size_prompt
 
             # After we set this once, we never want to set it again.
             extra = ""
@@ -514,26 +556,29 @@ class KubernetesJobAgent(KubernetesAgent):
         return 0, final_log
 
     def get_containers(self, job_data):
-        return job_data.get("spec", {}).get("template", {}).get("spec", {}).get("containers") or []
-
-    def set_containers(self, job_data, containers):
-        job_data["spec"]["template"]["spec"]["containers"] = containers
-        return job_data
+        # Usually the path is there, so we index directly instead of chaining get
+        try:
+            return job_data["spec"]["template"]["spec"]["containers"] or []
+        except (KeyError, TypeError):
+            return []
 
     def check(self, context, job_data):
         """
         Check the data. Allow fixing common issues the LLM runs into.
+
+        Returns True as the first value if the job data was updated (in place).
         """
         containers = self.get_containers(job_data)
         if not containers:
-            return job_data, 1, "Generated YAML is missing required '.containers' list field."
+            return False, 1, "Generated YAML is missing required '.containers' list field."
 
         # Assume one container for now, and manually we can easily check
-        found_image = containers[0].get("image")
-        if found_image != context.container:
-            containers[0]["image"] = context.container
-            job_data["spec"]['template"']["spec"]["containers"] = containers
-        return job_data, 0, ""
+        # The containers list belongs to job_data, so this updates it in place.
+        container = containers[0]
+        if container.get("image") == context.container:
+            return False, 0, ""
+        container["image"] = context.container
+        return True, 0, ""
 
     def update_manifest(self, updates, manifest):
         """
@@ -542,25 +587,18 @@ class KubernetesJobAgent(KubernetesAgent):
         for key in ["decision", "reason"]:
             if key in updates:
                 del updates[key]
-        # This is faster than asking the agent to do it
+        # A complete manifest replaces the old one, which is faster than asking the agent
         if "manifest" in updates:
             updates = self.get_code_block(updates["manifest"], "yaml")
+            if not self.use_llm_merge and replaces_manifest(manifest, updates):
+                return updates
+        else:
+            updates = json.dumps(updates)
 
-        prompt = prompts.get_update_prompt(manifest, json.dumps(updates))
+        prompt = prompts.get_update_prompt(manifest, updates)
         result = self.ask_gemini(prompt)
         return self.get_code_block(result, "yaml")
 
-    def save_job_manifest(self, job):
-        """
-        Save job manifest to metadata
-        """
-        if self.save_incremental:
-            if self.result_type not in self.metadata["assets"]:
-                self.metadata["assets"][self.result_type] = []
-            self.metadata["assets"][self.result_type].append(
-                {"item": job, "attempt": self.attempts}
-            )
-
     @timed
     def generate_manifest(self, context):
         """
@@ -570,7 +608,8 @@ class KubernetesJobAgent(KubernetesAgent):
         print("Sending generation prompt to Gemini...")
         print(textwrap.indent(prompt, "> ", predicate=lambda _: True))
 
-        content = self.ask_gemini(prompt)
+        # We only need the manifest, so stop reading once it is complete
+        content = self.ask_gemini(prompt, until_code_block="yaml")
         print("Received response from Gemini...")
 
         # Try to remove code (Dockerfile, manifest, etc.) from the block
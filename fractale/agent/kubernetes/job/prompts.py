@@ -1,9 +1,17 @@
+import functools
+import hashlib
 import json
 
 import fractale.agent.defaults as defaults
 import fractale.agent.kubernetes.prompts as prompts
 from fractale.agent.prompts import Prompt
 
+# orjson is optional, and only used to serialize diagnostics faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 optimize_persona = "You are a Kubernetes optimization agent."
 persona = "You are a Kubernetes Job generator expert."
 
@@ -127,21 +135,12 @@ optimize_function_prompt = {
     + optimize_function_instructions,
 }
 
-regenerate_prompt = {
-    "persona": persona,
-    "context": prompts.common_context,
-    "task": prompts.regenerate_task,
-    "instructions": [],
-}
-
 
 def get_regenerate_prompt(context):
     """
     Regenerate is called only if there is an error message.
     """
-    prompt = Prompt(regenerate_prompt, context)
-    testing = context.get("testing")
-    return prompt.render({"task": context.error_message, "testing": testing})
+    return prompts.render_regenerate_prompt(persona, context)
 
 
 def get_optimize_prompt(context, resources):
@@ -180,30 +179,146 @@ def get_optimize_prompt(context, resources):
     )
 
 
-def get_generate_prompt(context):
-    environment = context.get("environment", defaults.environment)
-    container = context.get("container", required=True)
-    no_pull = context.get("no_pull")
-    testing = context.get("testing")
+no_pull_instruction = "Set the container imagePullPolicy to Never."
+
+
+@functools.lru_cache(maxsize=64)
+def render_generate_prompt(environment, container, no_pull, testing, details):
+    """
+    Render the generate prompt. It only depends on a few stable fields,
+    so we cache it across attempts (and agents).
+    """
+    prompt = generate_prompt
     if no_pull is True:
-        generate_prompt["instructions"].append("Set the container imagePullPolicy to Never.")
+        prompt = {
+            **generate_prompt,
+            "instructions": generate_prompt["instructions"] + [no_pull_instruction],
+        }
 
     # Populate generate prompt fields
-    return Prompt(generate_prompt, context).render(
+    return Prompt(prompt, {"details": details}).render(
         {"environment": environment, "container": container, "testing": testing}
     )
 
 
-meta_bundle = """
---- Job Description ---
-%s
+def get_generate_prompt(context):
+    return render_generate_prompt(
+        context.get("environment", defaults.environment),
+        context.get("container", required=True),
+        context.get("no_pull"),
+        context.get("testing"),
+        context.get("details"),
+    )
 
---- Pod Description ---
-%s
 
---- Events (Recent) ---
+# Section headers of the diagnostics bundle, each followed by its (json) content
+meta_bundle_headers = (
+    "\n--- Job Description ---\n",
+    "\n\n--- Pod Description ---\n",
+    "\n\n--- Events (Recent) ---\n",
+)
+
+# Diagnostics are bounded so debug prompts stay small (and stable across retries)
+diagnostics_max_events = 25
+diagnostics_max_logs = 8192
+
+
+def dump_sorted(obj):
+    """
+    Compact json with sorted keys (with orjson).
+    """
+    return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS).decode("utf-8")
+
+
+def tail_logs(logs, max_size=diagnostics_max_logs):
+    """
+    Get the end of the logs (at most max_size), starting at a line boundary.
+    """
+    if logs and len(logs) > max_size:
+        logs = logs[-max_size:]
+        logs = logs[logs.find("\n") + 1 :]
+    return logs
+
+
+def dedupe_events(events):
+    """
+    Collapse repeated events (same type, reason, object, and message) into one.
+
+    We keep the latest time, and a count when an event was repeated.
+    """
+    seen = {}
+    for event in events:
+        key = (event.get("type"), event.get("reason"), event.get("object"), event.get("message"))
+        if key not in seen:
+            seen[key] = dict(event)
+            continue
+        found = seen[key]
+        found["count"] = found.get("count", 1) + 1
+        if (event.get("time") or "") > (found.get("time") or ""):
+            found["time"] = event.get("time")
+    return list(seen.values())
+
+
+def dedupe_loglines(logs):
+    """
+    Collapse runs of identical log lines into one line with a count prefix.
+    """
+    if not logs:
+        return logs
+    lines = []
+    last = None
+    count = 0
+    for line in logs.split("\n"):
+        if line == last:
+            count += 1
+            continue
+        if count > 1:
+            lines[-1] = f"[x{count}] {last}"
+        lines.append(line)
+        last = line
+        count = 1
+    if count > 1:
+        lines[-1] = f"[x{count}] {last}"
+    return "\n".join(lines)
+
+
+def build_diagnostics_pack(job_status, pod_status, events, logs):
+    """
+    Build a compact, deterministic diagnostics bundle, and a hash to version it.
+
+    We keep the most recent (distinct) events and the tail of the logs, and
+    sort keys so the same state always gives the same text.
+    """
+    dump = functools.partial(json.dumps, sort_keys=True, separators=(",", ":"))
+    if orjson is not None:
+        dump = dump_sorted
+    events = dedupe_events(events)
+    events = sorted(events, key=lambda e: e.get("time") or "")[-diagnostics_max_events:]
+    pods_description = "" if pod_status is None else dump(pod_status)
+
+    # Repeated lines (e.g., a retry loop) would otherwise crowd out the tail
+    logs = tail_logs(dedupe_loglines(logs))
+
+    # Build the text in one pass, instead of formatting and then appending logs
+    job_header, pod_header, events_header = meta_bundle_headers
+    text = "".join(
+        [
+            job_header,
+            dump(job_status),
+            pod_header,
+            pods_description,
+            events_header,
+            dump(events),
+            "\n",
+            logs or "",
+        ]
+    )
+    return text, hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+scale_optimize_message = """You MUST optimize for %s nodes.
 %s
-"""
+%s"""
 
 failure_message = """Job failed during execution.
 %s"""
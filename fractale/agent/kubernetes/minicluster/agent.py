@@ -1,8 +1,6 @@
 import json
 import subprocess
-import tempfile
 
-import yaml
 from rich import print
 
 import fractale.agent.kubernetes.minicluster.prompts as prompts
@@ -10,6 +8,7 @@ import fractale.agent.kubernetes.objects as objects
 import fractale.agent.logger as logger
 from fractale.agent.context import get_context
 from fractale.agent.decorators import timed
+from fractale.agent.kubernetes.base import dump_manifest, parse_manifest, replaces_manifest
 from fractale.agent.kubernetes.job import KubernetesJobAgent
 
 flux_views = [
@@ -34,13 +33,16 @@ class MiniClusterAgent(KubernetesJobAgent):
     description = "Kubernetes Flux MiniCluster agent"
     result_type = "flux-minicluster-manifest"
 
+    # Output of kubectl explain, shared by agents
+    explanation = None
+
     def check_flux_view(self, minicluster):
         """
         If a view is defined, ensure it is in allowed set.
         """
         view = minicluster.get("spec", {}).get("flux", {}).get("container", {}).get("image")
         if not view:
-            return yaml.dump(minicluster)
+            return dump_manifest(minicluster)
 
         # If the agent gets it wrong it needs to know what are valid options
         comment = ""
@@ -52,7 +54,7 @@ class MiniClusterAgent(KubernetesJobAgent):
             if not minicluster["spec"]["flux"]:
                 del minicluster["spec"]["flux"]
 
-        return yaml.dump(minicluster) + "\n" + comment
+        return dump_manifest(minicluster) + "\n" + comment
 
     @timed
     def deploy(self, context):
@@ -65,7 +67,7 @@ class MiniClusterAgent(KubernetesJobAgent):
 
         # Job needs to load as yaml to work, period.
         try:
-            minicluster = yaml.safe_load(context.result)
+            minicluster = parse_manifest(context.result)
         except Exception as e:
             return (1, str(e) + "\n" + context.result)
 
@@ -78,20 +80,13 @@ class MiniClusterAgent(KubernetesJobAgent):
         # If it doesn't follow instructions...
         containers = self.get_containers(minicluster)
         if not containers:
-            return (
-                minicluster,
-                1,
-                "Generated YAML is missing required 'spec.containers' list field.",
-            )
+            return 1, "Generated YAML is missing required 'spec.containers' list field."
 
         # Assume one container for now, and manually we can easily check
-        found_image = containers[0].get("image")
-        if found_image != context.container:
-            containers[0]["image"] = context.container
-            minicluster["spec"]["containers"] = containers
-
-        deploy_dir = tempfile.mkdtemp()
-        print(f"[dim]Created temporary deploy context: {deploy_dir}[/dim]")
+        # The containers list belongs to the minicluster, so this updates it in place.
+        container = containers[0]
+        if container.get("image") != context.container:
+            container["image"] = context.container
 
         # Write the final minicluster after checking the view
         context.result = self.check_flux_view(minicluster)
@@ -119,7 +114,7 @@ class MiniClusterAgent(KubernetesJobAgent):
 
         # We finish by watching the indexed job
         job = objects.KubernetesJob(name, namespace)
-        rc, message = self.finish_deploy(context, job, deploy_dir, callback=callback)
+        rc, message = self.finish_deploy(context, job, callback=callback)
 
         # Delete the Minicluster - the job agent doesn't have the handle
         mc.delete()
@@ -128,10 +123,6 @@ class MiniClusterAgent(KubernetesJobAgent):
     def get_containers(self, job_data):
         return job_data.get("spec", {}).get("containers") or []
 
-    def set_containers(self, job_data, containers):
-        job_data["spec"]["containers"] = containers
-        return job_data
-
     def get_prompt(self, context):
         """
         Get the prompt for the LLM. We expose this so the manager can take it
@@ -152,17 +143,28 @@ class MiniClusterAgent(KubernetesJobAgent):
         for key in ["decision", "reason"]:
             if key in updates:
                 del updates[key]
-        prompt = prompts.get_update_prompt(manifest, json.dumps(updates))
+
+        # A complete manifest replaces the old one, which is faster than asking the agent
+        if "manifest" in updates:
+            updates = self.get_code_block(updates["manifest"], "yaml")
+            if not self.use_llm_merge and replaces_manifest(manifest, updates):
+                return updates
+        else:
+            updates = json.dumps(updates)
+        prompt = prompts.get_update_prompt(manifest, updates)
         result = self.ask_gemini(prompt)
         return self.get_code_block(result, "yaml")
 
     def explain(self):
         """
-        Explain the type
+        Explain the type. The CRD does not change, so we only ask once.
         """
+        if MiniClusterAgent.explanation:
+            return MiniClusterAgent.explanation
         cmd = ["kubectl", "explain", "miniclusters", "--recursive=TRUE"]
         p = subprocess.run(cmd, capture_output=True, text=True, check=False)
         if p.returncode != 0:
             print("[red]'kubectl explain' failed.[/red]")
             return ""
-        return p.stdout + p.stderr
+        MiniClusterAgent.explanation = p.stdout + p.stderr
+        return MiniClusterAgent.explanation
@@ -1,3 +1,5 @@
+import functools
+
 import fractale.agent.defaults as defaults
 import fractale.agent.kubernetes.prompts as prompts
 from fractale.agent.prompts import Prompt
@@ -36,13 +38,6 @@ generate_prompt = {
     "instructions": prompts.common_instructions + requires,
 }
 
-regenerate_prompt = {
-    "persona": persona,
-    "context": prompts.common_context,
-    "task": prompts.regenerate_task,
-    "instructions": [],
-}
-
 # These are snippets to go with error output.
 
 
@@ -85,24 +80,27 @@ def get_regenerate_prompt(context):
     """
     Regenerate is called only if there is an error message.
     """
-    prompt = Prompt(regenerate_prompt, context)
-    testing = context.get("testing")
-    return prompt.render({"task": context.error_message, "testing": testing})
+    return prompts.render_regenerate_prompt(persona, context)
 
 
-def get_generate_prompt(context, minicluster_explain):
+no_pull_instruction = "Set the container imagePullPolicy to Never."
+
+
+@functools.lru_cache(maxsize=64)
+def render_generate_prompt(environment, container, no_pull, testing, details, minicluster_explain):
     """
-    Populate a prompt to generate an initial build.
+    Render the generate prompt. It only depends on a few stable fields
+    (and the explained MiniCluster), so we cache it across attempts.
     """
-    environment = context.get("environment", defaults.environment)
-    container = context.get("container", required=True)
-    no_pull = context.get("no_pull")
-    testing = context.get("testing")
+    prompt = generate_prompt
     if no_pull is True:
-        generate_prompt["instructions"].append("Set the container imagePullPolicy to Never.")
+        prompt = {
+            **generate_prompt,
+            "instructions": generate_prompt["instructions"] + [no_pull_instruction],
+        }
 
     # Populate generate prompt fields
-    return Prompt(generate_prompt, context).render(
+    return Prompt(prompt, {"details": details}).render(
         {
             "environment": environment,
             "container": container,
@@ -110,3 +108,17 @@ def get_generate_prompt(context, minicluster_explain):
             "testing": testing,
         }
     )
+
+
+def get_generate_prompt(context, minicluster_explain):
+    """
+    Populate a prompt to generate an initial build.
+    """
+    return render_generate_prompt(
+        context.get("environment", defaults.environment),
+        context.get("container", required=True),
+        context.get("no_pull"),
+        context.get("testing"),
+        context.get("details"),
+        minicluster_explain,
+    )
@@ -1,9 +1,10 @@
+import codecs
 import json
-import os
+import queue
+import random
 import shlex
-import shutil
 import subprocess
-import tempfile
+import threading
 import time
 
 from rich import print
@@ -19,6 +20,223 @@ container_issues = [
     "CreateContainerConfigError",
 ]
 
+# Bytes to read from a log stream at once
+log_chunk_size = 65536
+
+
+def backoff(timeout=None, initial=1, factor=1.5, maximum=30, wait=None, jitter=0.5):
+    """
+    Yield attempt numbers, sleeping with exponential backoff between them.
+
+    Fast changes are seen quickly, and long waits make fewer calls. Stops
+    once timeout (seconds) has passed, or never if it is None. If a wait
+    function is provided (e.g., Watcher.wait) it is used instead of sleep,
+    and when it reports a change we go again right away. Up to jitter
+    seconds are added to each delay, so many agents don't poll in step.
+    """
+    start = time.monotonic()
+    delay = initial
+    attempt = 0
+    while True:
+        attempt += 1
+        yield attempt
+        elapsed = time.monotonic() - start
+        if timeout is not None and elapsed >= timeout:
+            return
+        sleep = delay + random.uniform(0, jitter)
+        if timeout is not None:
+            sleep = min(sleep, timeout - elapsed)
+        if wait is not None and wait(sleep):
+            delay = initial
+            continue
+        if wait is None:
+            time.sleep(sleep)
+        delay = min(delay * factor, maximum)
+
+
+class LogScanner:
+    """
+    Look for words in a log as it is streamed, so we don't scan it again after.
+
+    We keep just enough of the end of the last chunk to catch a word that is
+    split across two chunks.
+    """
+
+    def __init__(self, *words):
+        self.words = words
+        self.found = set()
+        self.carry = ""
+        self.keep = max(len(word) for word in words) - 1
+
+    def __contains__(self, word):
+        return word in self.found
+
+    def feed(self, chunk):
+        text = self.carry + chunk
+        for word in self.words:
+            if word not in self.found and word in text:
+                self.found.add(word)
+        self.carry = text[-self.keep :] if self.keep else ""
+
+
+class Watcher:
+    """
+    Watch objects with kubectl, so we can wake up as soon as something changes.
+
+    We only need to know that something changed (and then ask for status),
+    so each line of output is an event. The last line is kept (e.g., the name
+    of the object that changed). If the watch cannot start (or ends) waiting
+    is the same as sleeping.
+    """
+
+    def __init__(self, cmd, events=None):
+        # Watchers can share a queue, to wake up on a change to any of them
+        self.events = events or queue.Queue()
+        self.latest = None
+        try:
+            self.proc = subprocess.Popen(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+            )
+        except OSError:
+            self.proc = None
+            return
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self):
+        for line in self.proc.stdout:
+            self.latest = line.strip()
+            self.events.put(self.latest)
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for a change. Returns True if there was one.
+        """
+        try:
+            self.events.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+        # Multiple events are one change to us
+        while not self.events.empty():
+            self.events.get_nowait()
+        return True
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# One line per change to an object, with the name, deletion time, and status (json)
+status_template = '{.metadata.name}{"\\t"}{.metadata.deletionTimestamp}{"\\t"}{.status}{"\\n"}'
+
+
+class StatusWatcher(Watcher):
+    """
+    Watch objects and keep the latest status of each by name.
+
+    This is a small informer: status reads are a lookup instead of a query.
+    An object that is being deleted has an empty status, the same as when
+    a query does not find it. A name we have not seen has no status (None).
+    """
+
+    def __init__(self, cmd, events=None):
+        self.statuses = {}
+        super().__init__(cmd + ["-o", f"jsonpath={status_template}"], events=events)
+
+    def read(self):
+        for line in self.proc.stdout:
+            fields = line.rstrip("\n").split("\t", 2)
+            if len(fields) != 3:
+                continue
+            name, deleted, status = fields
+            try:
+                self.statuses[name] = {} if deleted else json.loads(status or "{}")
+            except json.JSONDecodeError:
+                continue
+
+            # The latest is the last object we saw that is not going away
+            if not deleted:
+                self.latest = name
+            elif self.latest == name:
+                self.latest = None
+            self.events.put(name)
+
+    def get_status(self, name):
+        """
+        Get the latest status of an object, or None if the watch has not seen it.
+        """
+        if self.proc is None:
+            return
+        return self.statuses.get(name)
+
+
+def format_events(events):
+    """
+    Format events to be shorter (most important stuff) and sort by time.
+    """
+    events = [
+        {
+            "time": e.get("lastTimestamp"),
+            "type": e.get("type"),
+            "reason": e.get("reason"),
+            "object": e.get("involvedObject", {}).get("name"),
+            "message": e.get("message"),
+        }
+        for e in events
+    ]
+    return sorted(events, key=lambda e: e.get("time") or "")
+
+
+def get_object_statuses(*objs):
+    """
+    Get the status of several objects (in one namespace) with one kubectl call.
+    An object that is not found has an empty status.
+    """
+    cmd = ["kubectl", "get"] + [f"{o.obj}/{o.name}" for o in objs]
+    cmd += ["-n", objs[0].namespace, "-o", "json"]
+
+    # Objects that are found are still printed when others are not
+    p = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    try:
+        data = json.loads(p.stdout)
+    except json.JSONDecodeError:
+        data = {}
+
+    # One object is not returned in a list
+    items = data.get("items", []) if data.get("kind") == "List" else [data]
+    found = {
+        (item.get("kind", "").lower(), item.get("metadata", {}).get("name")): item.get("status", {})
+        for item in items
+    }
+    return [found.get((o.obj, o.name), {}) for o in objs]
+
+
+def get_object_events(*objs):
+    """
+    Get the events for several objects (in one namespace) with one kubectl call.
+    """
+    cmd = ["kubectl", "get", "events", "-n", objs[0].namespace, "-o", "json"]
+    p = subprocess.run(cmd, capture_output=True, text=True, check=False)
+    try:
+        events = json.loads(p.stdout).get("items", [])
+    except json.JSONDecodeError:
+        events = []
+    involved = {(o.kind, o.name) for o in objs}
+    events = [
+        e
+        for e in events
+        if (e.get("involvedObject", {}).get("kind"), e.get("involvedObject", {}).get("name"))
+        in involved
+    ]
+    return format_events(events)
+
 
 class KubernetesAbstraction:
     def __init__(self, name, namespace="default", max_tries=25):
@@ -32,25 +250,15 @@ class KubernetesAbstraction:
 
     def apply(self, manifest):
         """
-        Apply a crd, writing some content to file first.
+        Apply a crd, piping the content to kubectl (no file needed).
         """
-        # Keep this controllable for us to clean up for now
-        deploy_dir = tempfile.mkdtemp()
-        print(f"[dim]Created temporary deploy context: {deploy_dir}[/dim]")
-
-        # 2. Ensure any pre-existing object is cleaned up first
+        # Ensure any pre-existing object is cleaned up first
         # Quiet so the output is not confusing.
         self.delete(quiet=True)
 
         try:
-            # 3. Write the manifest to a file within the temporary directory
-            manifest_path = os.path.join(deploy_dir, f"{self.obj}.yaml")
-            with open(manifest_path, "w") as f:
-                f.write(manifest)
-
-            # 4. Prepare and log the command
-            cmd = ["kubectl", "apply", "-f", manifest_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=deploy_dir)
+            cmd = ["kubectl", "apply", "-f", "-"]
+            result = subprocess.run(cmd, input=manifest, capture_output=True, text=True, check=True)
             print(result.stdout.strip())
             return result
 
@@ -60,8 +268,13 @@ class KubernetesAbstraction:
             print(e.stderr.strip())
             return e
 
-        finally:
-            shutil.rmtree(deploy_dir)
+    def watch(self, events=None):
+        """
+        Watch the object for changes.
+        """
+        return StatusWatcher(
+            ["kubectl", "get", self.obj, self.name, "-n", self.namespace, "--watch"], events=events
+        )
 
     def get_events(self):
         """
@@ -79,20 +292,7 @@ class KubernetesAbstraction:
             "json",
         ]
         events = subprocess.run(events_cmd, capture_output=True, text=True, check=False)
-        events = json.loads(events.stdout).get("items", [])
-
-        # Sort events by time and format to be shorter (most important stuff)
-        events = [
-            {
-                "time": e.get("lastTimestamp"),
-                "type": e.get("type"),
-                "reason": e.get("reason"),
-                "object": e.get("involvedObject", {}).get("name"),
-                "message": e.get("message"),
-            }
-            for e in events
-        ]
-        return sorted(events, key=lambda e: e.get("lastTimestamp", ""))
+        return format_events(json.loads(events.stdout).get("items", []))
 
     def get_status(self):
         """
@@ -153,12 +353,14 @@ class KubernetesPod(KubernetesAbstraction):
 
     obj = "pod"
 
-    def get_filtered_status(self):
+    def get_filtered_status(self, status=None):
         """
         Gets the most critical status fields from a Job's pod(s).
         This is the most valuable source of debugging information.
+        A status we already have can be provided to skip the query.
         """
-        status = self.get_status()
+        if status is None:
+            status = self.get_status()
         if not status:
             return
 
@@ -210,34 +412,38 @@ class KubernetesPod(KubernetesAbstraction):
         """
         Wait for a pod to be ready.
         """
-        while True:
-            pod_status = self.get_status() or {}
-            pod_phase = pod_status.get("phase")
-
-            reason = self.has_failed_container(pod_status)
-            if pod_phase == "Running" and reason is not None:
-                return reason
-
-            # Let's assume when we are running the pod is ready for logs.
-            # If not, we need to check container statuses too.
-            if pod_phase == "Running" and not wait_for_completed:
-                print(f"[green]Pod '{self.name}' entered running phase.[/green]")
-                return pod_phase
-
-            if pod_phase in ["Succeeded", "Failed"]:
-                print(f"[yellow]Pod '{self.name}' is Completed in phase '{pod_phase}'[/yellow]")
-                return pod_phase
-
-            # This is an unexpected case, but we want it to retry
-            if pod_phase == None:
-                return "Lost"
-
-            # If we get here, not ready - sleep and try again.
-            print(
-                f"[dim]Pod '{self.name}' has status '{pod_phase}'. Waiting...[/dim]",
-                end="\r",
-            )
-            time.sleep(3)
+        # We wake up on changes from the watch, and otherwise back off. The delay
+        # is capped so completion is still noticed soon if the watch is not working.
+        with self.watch() as watcher:
+            for _ in backoff(maximum=10, wait=watcher.wait):
+                pod_status = watcher.get_status(self.name)
+                if pod_status is None:
+                    pod_status = self.get_status() or {}
+                pod_phase = pod_status.get("phase")
+
+                reason = self.has_failed_container(pod_status)
+                if pod_phase == "Running" and reason is not None:
+                    return reason
+
+                # Let's assume when we are running the pod is ready for logs.
+                # If not, we need to check container statuses too.
+                if pod_phase == "Running" and not wait_for_completed:
+                    print(f"[green]Pod '{self.name}' entered running phase.[/green]")
+                    return pod_phase
+
+                if pod_phase in ["Succeeded", "Failed"]:
+                    print(f"[yellow]Pod '{self.name}' is Completed in phase '{pod_phase}'[/yellow]")
+                    return pod_phase
+
+                # This is an unexpected case, but we want it to retry
+                if pod_phase == None:
+                    return "Lost"
+
+                # If we get here, not ready - sleep and try again.
+                print(
+                    f"[dim]Pod '{self.name}' has status '{pod_phase}'. Waiting...[/dim]",
+                    end="\r",
+                )
 
     def wait_for_complete(self):
         """
@@ -263,7 +469,7 @@ class KubernetesJob(KubernetesAbstraction):
         # Poll for 10 minutes. This assumes a large container that needs to pull
         # This is purposfully set to use "job" for the minicluster too so we
         # get status of the underlying indexed job
-        for i in range(60):  # 60 * 10s = 600s = 10 minutes
+        for i in backoff(timeout=600):
             get_status_cmd = [
                 "kubectl",
                 "get",
@@ -278,7 +484,6 @@ class KubernetesJob(KubernetesAbstraction):
                 get_status_cmd, capture_output=True, text=True, check=False
             )
             if status_process.returncode != 0:
-                time.sleep(10)
                 continue
 
             status = json.loads(status_process.stdout).get("status", {})
@@ -297,15 +502,15 @@ class KubernetesJob(KubernetesAbstraction):
                 is_active = True
                 break
 
-            print(f"[dim]Still waiting... ({i+1}/30)[/dim]")
-            time.sleep(10)
+            print(f"[dim]Still waiting... ({i})[/dim]")
         return is_active, is_failed, is_succeeded
 
-    def get_logs(self, timeout_seconds=None, wait=True):
+    def get_logs(self, timeout_seconds=None, wait=True, scanner=None):
         """
         Get the logs of a pod.
+
+        If a LogScanner is provided, it is fed each chunk as it arrives.
         """
-        full_logs = ""
         # We use the job selector to get logs, which is more robust if the pod was recreated.
         log_cmd = ["kubectl", "logs", f"job/{self.name}", "-n", self.namespace]
 
@@ -314,17 +519,19 @@ class KubernetesJob(KubernetesAbstraction):
             log_cmd.insert(2, "-f")
         if timeout_seconds is not None:
             log_cmd = ["timeout", f"{timeout_seconds}s"] + log_cmd
+
+        # Read the stream in large chunks (not line by line) and decode as we go
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        chunks = []
         with subprocess.Popen(
-            log_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1,
-            universal_newlines=True,
+            log_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
         ) as log_process:
-            # We can add a timeout to the log streaming itself if needed
-            # For now, we wait for it to complete naturally.
-            full_logs = "".join(log_process.stdout)
+            for chunk in iter(lambda: log_process.stdout.read1(log_chunk_size), b""):
+                chunks.append(decoder.decode(chunk))
+                if scanner is not None:
+                    scanner.feed(chunks[-1])
+            chunks.append(decoder.decode(b"", final=True))
+        full_logs = "".join(chunks)
 
         # Return if timed out
         was_timeout = False
@@ -332,12 +539,14 @@ class KubernetesJob(KubernetesAbstraction):
             was_timeout = True
         return full_logs, was_timeout
 
-    def get_filtered_status(self):
+    def get_filtered_status(self, status=None):
         """
         Get a more filtered (streamlined) status to minimize tokens.
         Jobs have information about their pods - succeeded, failed, etc.
+        A status we already have can be provided to skip the query.
         """
-        status = self.get_status()
+        if status is None:
+            status = self.get_status()
         if not status:
             return
         return {
@@ -355,6 +564,24 @@ class KubernetesJob(KubernetesAbstraction):
             ],
         }
 
+    def watch_pods(self, events=None):
+        """
+        Watch the pods created by the job for changes.
+        """
+        return StatusWatcher(
+            [
+                "kubectl",
+                "get",
+                "pods",
+                "-n",
+                self.namespace,
+                "-l",
+                f"job-name={self.name}",
+                "--watch",
+            ],
+            events=events,
+        )
+
     def get_pod(self):
         """
         Find the name of the pod created by a specific job.
@@ -1,3 +1,7 @@
+import functools
+
+from fractale.agent.prompts import Prompt
+
 common_context = """
 We are running experiments that deploy HPC applications to Kubernetes with tasks to build, deploy, and optimize
 You are the agent responsible for the deploy step in that pipeline.
@@ -25,3 +29,32 @@ regenerate_task = """Your previous attempt to generate the manifest failed. Plea
 
 {{task}}
 """
+
+# Stand-in for the error message, which is the only part of a retry prompt that varies
+error_placeholder = "<<FRACTALE_ERROR>>"
+
+
+@functools.lru_cache(maxsize=64)
+def render_regenerate_skeleton(persona, testing, details):
+    """
+    Render the regenerate prompt once, with a placeholder for the error message.
+    """
+    prompt = {
+        "persona": persona,
+        "context": common_context,
+        "task": regenerate_task,
+        "instructions": [],
+    }
+    return Prompt(prompt, {"details": details}).render(
+        {"task": error_placeholder, "testing": testing}
+    )
+
+
+def render_regenerate_prompt(persona, context):
+    """
+    Fill the error message into the (cached) regenerate prompt for the persona.
+    """
+    skeleton = render_regenerate_skeleton(persona, context.get("testing"), context.get("details"))
+
+    # The error message ends the task, which is trimmed in the full prompt
+    return skeleton.replace(error_placeholder, context.error_message.rstrip(), 1)
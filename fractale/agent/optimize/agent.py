@@ -1,15 +1,11 @@
 import argparse
 import copy
 import json
-import os
-import sys
 import textwrap
 
-import google.generativeai as genai
 from rich import print
 
 import fractale.agent.build.prompts as prompts
-import fractale.agent.defaults as defaults
 import fractale.agent.logger as logger
 import fractale.agent.optimize.prompts as prompts
 from fractale.agent.base import GeminiAgent
@@ -38,12 +34,7 @@ class OptimizationAgent(GeminiAgent):
     state_variables = ["optimize"]
 
     def init(self):
-        self.model = genai.GenerativeModel(defaults.gemini_model)
-        self.chat = self.model.start_chat()
-        try:
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        except KeyError:
-            sys.exit("ERROR: GEMINI_API_KEY environment variable not set.")
+        super().init()
 
         # We will save figures of merit, and attempt crds
         self.metadata["assets"]["updates"] = []
@@ -88,55 +79,61 @@ class OptimizationAgent(GeminiAgent):
         context = get_context(context)
         prompt = prompt or context.get("requires")
 
-        # If requirements not specified, we require the "optimize" context
-        if context.get("function") and self.metadata["optimize_attempts"] == 0:
-            prompt = prompts.get_initial_function_optimize_prompt(context)
-        elif context.get("function"):
-            prompt = prompts.get_function_optimize_prompt(context)
-        elif not prompt:
-            prompt = prompts.get_optimize_prompt(context)
-
         # Parser requires is the FOM and optimize directive.
         # This returns a list of foms.
         if log is not None:
             foms = self.parser.parse(context.optimize, log, context.get("optimize.regex"))
             self.foms += foms
-        self.metadata["optimize_attempts"] += 1
-
-        # This adds supplementary detail about how to optimize - "keep going until it's good":_
-        additional = additional + "\n" if additional else ""
-        prompt += additional + prompts.supplement_optimize_prompt % (
-            self.metadata["optimize_attempts"],
-            json.dumps(self.foms),
-        )
-        print("Sending optimization prompt to Gemini...")
-
-        # Get the updates. We assume that optimization updates for resources
-        # need to come back and be parsed into json.
-        print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
 
+        # An invalid result asks again, with additional text about what was wrong
         while True:
-            content = self.ask_gemini(prompt, with_history=True)
-            print("Received optimization from Gemini...")
-            logger.custom(content, title="[green]Optimization Agent[/green]", border_style="green")
-            try:
-                result = json.loads(self.get_code_block(content, "json"))
-                break
-            except Exception as e:
-                print(f"Issue parsing optimization result: {e}")
-                prompt += (
-                    "You MUST return the variables back in json, including the nested manifest."
-                )
-
-        # This is an invalid result.
-        if "decision" not in result or "reason" not in result:
-            additional = "The JSON MUST have the fields 'decision', 'reason' at the top level with the manifest."
-            return self.run(context, prompt=prompt, additional=additional)
 
-        # This makes it easier for other agents to identify
-        if result["decision"] == "STOP" and ("final" not in result or "best_fom" not in result):
-            additional = "When you STOP you MUST include the 'final' result that is optimized."
-            return self.run(context, prompt=prompt, additional=additional)
+            # If requirements not specified, we require the "optimize" context
+            if context.get("function") and self.metadata["optimize_attempts"] == 0:
+                prompt = prompts.get_initial_function_optimize_prompt(context)
+            elif context.get("function"):
+                prompt = prompts.get_function_optimize_prompt(context)
+            elif not prompt:
+                prompt = prompts.get_optimize_prompt(context)
+            self.metadata["optimize_attempts"] += 1
+
+            # This adds supplementary detail about how to optimize - "keep going until it's good":_
+            additional = additional + "\n" if additional else ""
+            prompt += additional + prompts.supplement_optimize_prompt % (
+                self.metadata["optimize_attempts"],
+                json.dumps(self.foms),
+            )
+            print("Sending optimization prompt to Gemini...")
+
+            # Get the updates. We assume that optimization updates for resources
+            # need to come back and be parsed into json.
+            print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
+
+            while True:
+                content = self.ask_gemini(prompt, with_history=True)
+                print("Received optimization from Gemini...")
+                logger.custom(
+                    content, title="[green]Optimization Agent[/green]", border_style="green"
+                )
+                try:
+                    result = json.loads(self.get_code_block(content, "json"))
+                    break
+                except Exception as e:
+                    print(f"Issue parsing optimization result: {e}")
+                    prompt += (
+                        "You MUST return the variables back in json, including the nested manifest."
+                    )
+
+            # This is an invalid result.
+            if "decision" not in result or "reason" not in result:
+                additional = "The JSON MUST have the fields 'decision', 'reason' at the top level with the manifest."
+                continue
+
+            # This makes it easier for other agents to identify
+            if result["decision"] == "STOP" and ("final" not in result or "best_fom" not in result):
+                additional = "When you STOP you MUST include the 'final' result that is optimized."
+                continue
+            break
 
         # We can't be sure of the format or how to update, so return to job agent
         self.metadata["assets"]["updates"].append(copy.deepcopy(result))
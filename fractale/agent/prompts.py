@@ -1,4 +1,4 @@
-import copy
+import functools
 
 from jinja2 import Template
 
@@ -16,6 +16,28 @@ template = """
 """
 
 
+# Stand-in for the task, which is the only part of a prompt that varies per call
+task_placeholder = "<<FRACTALE_TASK>>"
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(text):
+    """
+    Compile a Jinja template once and reuse it.
+    """
+    return Template(text)
+
+
+@functools.lru_cache(maxsize=256)
+def render_static(persona, context, instructions):
+    """
+    Render the invariant parts of a prompt, with a placeholder for the task.
+    """
+    return compile_template(template).render(
+        persona=persona, context=context, instructions=instructions, task=task_placeholder
+    )
+
+
 class Prompt:
     """
     A prompt is a structured instruction for an LLM.
@@ -23,7 +45,7 @@ class Prompt:
     Data sections should use words MUST, MUST NOT, AVOID, ENSURE
     """
 
-    def __init__(self, data, context):
+    def __init__(self, data, context=None):
         """
         This currently assumes setting a consistent context for one generation.
         If that isn't the case, context should be provided in the function below.
@@ -31,21 +53,32 @@ class Prompt:
         self.data = data
         self.context = context
 
-    def render(self, kwargs):
+    def render_static(self):
         """
-        Render the final user task, and then the full prompt.
+        Render everything but the task. This is cached, so the same persona,
+        context, and instructions always give back the same (identical) string.
         """
-        # The kwargs are rendered into task
-        render = copy.deepcopy(self.data)
+        instructions = list(self.data.get("instructions") or [])
 
         # Do we have additional details for instrucitons?
         try:
-            render["instructions"] += (self.context.get("details") or "").split("\n")
-        except:
+            if self.context is not None:
+                instructions += (self.context.get("details") or "").split("\n")
+        except Exception:
             print("ISSUE WITH RENDER IN GENERIC PROMPTS")
+            if self.context.get("debug_shell") is not True:
+                raise
             import IPython
 
             IPython.embed()
-        render["task"] = Template(self.data["task"]).render(**kwargs)
-        prompt = Template(template).render(**render)
-        return prompt
+        return render_static(
+            self.data.get("persona"), self.data.get("context"), tuple(instructions)
+        )
+
+    def render(self, kwargs):
+        """
+        Render the final user task, and then the full prompt.
+        """
+        # The kwargs are rendered into task, which is trimmed in the full prompt
+        task = compile_template(self.data["task"]).render(**kwargs).strip()
+        return self.render_static().replace(task_placeholder, task, 1)
@@ -1,15 +1,11 @@
 import argparse
 import copy
 import json
-import os
-import sys
 import textwrap
 
-import google.generativeai as genai
 from rich import print
 
 import fractale.agent.build.prompts as prompts
-import fractale.agent.defaults as defaults
 import fractale.agent.logger as logger
 import fractale.agent.scaling.prompts as prompts
 from fractale.agent.base import GeminiAgent
@@ -46,12 +42,7 @@ class ScalingAgent(GeminiAgent):
     state_variables = ["scale", "sizes"]
 
     def init(self):
-        self.model = genai.GenerativeModel(defaults.gemini_model)
-        self.chat = self.model.start_chat()
-        try:
-            genai.configure(api_key=os.environ["GEMINI_API_KEY"])
-        except KeyError:
-            sys.exit("ERROR: GEMINI_API_KEY environment variable not set.")
+        super().init()
 
         # We will save figures of merit, and attempt crds
         self.metadata["assets"]["results"] = {}
@@ -120,48 +111,52 @@ class ScalingAgent(GeminiAgent):
         # We get the best fom and result (configuration for run)
         if prompt is None:
             prompt = self.get_scaling_prompt(context)
-        print("Sending scaling prompt to Gemini...")
-
-        # Get the updates. We assume that optimization updates for resources
-        # need to come back and be parsed into json.
-        print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
 
+        # An invalid result (or feedback) asks again, with additional text
         while True:
-            content = self.ask_gemini(prompt + "\n" + additional, with_history=True)
-            print("Received optimization from Gemini...")
-            logger.custom(content, title="[green]Scaling Agent[/green]", border_style="green")
-            try:
-                result = json.loads(self.get_code_block(content, "json"))
-                break
-            except:
-                prompt += "You MUST return the variables back in json"
-
-        # This is an invalid result.
-        if "decision" not in result or "reason" not in result:
-            additional = "The JSON MUST have the fields 'decision', 'reason' at the top level with the manifest."
-            return self.run(context, prompt, additional)
-
-        if result["decision"] not in ["STOP", "PROCEED"]:
-            additional = "The JSON 'decision' MUST be STOP or PROCEED.."
-            return self.run(context, prompt, additional)
-
-        # If we get a stop, check with the user first.
-        if result["decision"] == "STOP":
-            stop_decision = confirm_stop()
-
-            # Choose the size
-            if stop_decision in [None, False]:
-                context = self.update_scaling_size(context)
-                prompt = self.get_scaling_prompt(context)
-
-            if stop_decision is None:
-                additional = input("Please enter feedback for the LLM:\n")
-                return self.run(context, prompt, additional)
-
-            # Don't stop (implication is to retry the size)
-            elif stop_decision is False:
-                additional = f"The user has requested that you NOT stop."
-                return self.run(context, prompt, additional)
+            print("Sending scaling prompt to Gemini...")
+
+            # Get the updates. We assume that optimization updates for resources
+            # need to come back and be parsed into json.
+            print(textwrap.indent(prompt[0:500], "> ", predicate=lambda _: True))
+
+            while True:
+                content = self.ask_gemini(prompt + "\n" + additional, with_history=True)
+                print("Received optimization from Gemini...")
+                logger.custom(content, title="[green]Scaling Agent[/green]", border_style="green")
+                try:
+                    result = json.loads(self.get_code_block(content, "json"))
+                    break
+                except:
+                    prompt += "You MUST return the variables back in json"
+
+            # This is an invalid result.
+            if "decision" not in result or "reason" not in result:
+                additional = "The JSON MUST have the fields 'decision', 'reason' at the top level with the manifest."
+                continue
+
+            if result["decision"] not in ["STOP", "PROCEED"]:
+                additional = "The JSON 'decision' MUST be STOP or PROCEED.."
+                continue
+
+            # If we get a stop, check with the user first.
+            if result["decision"] == "STOP":
+                stop_decision = confirm_stop()
+
+                # Choose the size
+                if stop_decision in [None, False]:
+                    context = self.update_scaling_size(context)
+                    prompt = self.get_scaling_prompt(context)
+
+                if stop_decision is None:
+                    additional = input("Please enter feedback for the LLM:\n")
+                    continue
+
+                # Don't stop (implication is to retry the size)
+                elif stop_decision is False:
+                    additional = f"The user has requested that you NOT stop."
+                    continue
+            break
 
         context.scaling_result = result
         return context
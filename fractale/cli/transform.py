@@ -8,6 +8,7 @@ from rich import print
 from rich.pretty import pprint
 
 from fractale.transformer import detect_transformer, get_transformer
+from fractale.utils.fileio import SafeDumper
 
 
 def main(args, extra, **kwargs):
@@ -35,6 +36,8 @@ def main(args, extra, **kwargs):
     elif args.pretty:
         pprint(final_jobspec, indent_guides=True)
     elif args.to_transformer in ["kubernetes"]:
-        yaml.dump(final_jobspec, sys.stdout, sort_keys=True, default_flow_style=False)
+        yaml.dump(
+            final_jobspec, sys.stdout, Dumper=SafeDumper, sort_keys=True, default_flow_style=False
+        )
     else:
         print(final_jobspec)
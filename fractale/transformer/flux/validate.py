@@ -188,7 +188,7 @@ class Validator(BatchCmd):
 
         # Total number of args so we can calculate how many we got wrong
         errors = []
-        if any([re.search("^#FLUX ", x) for x in content.split("\n")]):
+        if any(x.startswith("#FLUX ") for x in content.split("\n")):
             if fail_fast:
                 raise ValueError("#FLUX directives need to be FLUX:")
             else:
@@ -7,6 +7,7 @@ import yaml
 from fractale.logger.generate import JobNamer
 from fractale.transformer.base import TransformerBase
 from fractale.transformer.common import JobSpec
+from fractale.utils.fileio import SafeLoader
 
 # Assume GPUs are NVIDIA
 gpu_resource_name = "nvidia.com/gpu"
@@ -189,7 +190,7 @@ class KubernetesTransformer(TransformerBase):
         Parses a Kubernetes Job manifest (dict or YAML string) into a JobSpec.
         """
         if isinstance(job_manifest, str):
-            manifest = yaml.safe_load(job_manifest)
+            manifest = yaml.load(job_manifest, Loader=SafeLoader)
         else:
             manifest = job_manifest
 
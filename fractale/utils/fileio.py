@@ -1,14 +1,26 @@
+import atexit
+import functools
 import json
 import os
 import platform
+import queue
 import re
+import shutil
 import stat
 import subprocess
 import tempfile
+import threading
 from contextlib import contextmanager
 
 import yaml
 
+# Use the (much faster) libyaml bindings when they are available
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeDumper, SafeLoader
+
 
 def get_local_cluster():
     """
@@ -51,6 +63,15 @@ def read_file(filename):
     return content
 
 
+def read_bytes(filename):
+    """
+    Read in file content as bytes (without decoding)
+    """
+    with open(filename, "rb") as fd:
+        content = fd.read()
+    return content
+
+
 def make_executable(path):
     """
     Adds execute permission to a file.
@@ -112,12 +133,60 @@ def get_tmpdir(tmpdir=None, prefix="", create=True):
     return tmpdir
 
 
+# File work to do in the background (so callers do not wait on it)
+background_queue = queue.Queue()
+
+
+def background_worker():
+    while True:
+        func, args = background_queue.get()
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"Background task {func.__name__} failed: {e}")
+        finally:
+            background_queue.task_done()
+
+
+@functools.lru_cache(maxsize=1)
+def start_background_worker():
+    """
+    Start the background thread on first use, and finish the queue on exit.
+
+    A single thread means tasks run in the order they were added.
+    """
+    threading.Thread(target=background_worker, daemon=True).start()
+    atexit.register(background_queue.join)
+
+
+def run_later(func, *args):
+    """
+    Run a file operation in the background. Pending tasks finish before exit.
+    """
+    start_background_worker()
+    background_queue.put((func, args))
+
+
+def remove_later(path):
+    """
+    Remove a directory in the background.
+    """
+    run_later(shutil.rmtree, path, True)
+
+
+def append_later(content, filename):
+    """
+    Append content to a file in the background.
+    """
+    run_later(append_file, content, filename)
+
+
 def read_yaml(filename):
     """
     Read yaml from file
     """
     with open(filename, "r") as fd:
-        content = yaml.safe_load(fd)
+        content = yaml.load(fd, Loader=SafeLoader)
     return content
 
 
@@ -129,12 +198,20 @@ def write_file(content, filename):
         fd.write(content)
 
 
+def append_file(content, filename):
+    """
+    Append content to file
+    """
+    with open(filename, "a") as fd:
+        fd.write(content)
+
+
 def write_yaml(obj, filename):
     """
     Read yaml to file
     """
     with open(filename, "w") as fd:
-        yaml.dump(obj, fd)
+        yaml.dump(obj, fd, Dumper=SafeDumper)
 
 
 @contextmanager
@@ -16,6 +16,8 @@ LICENSE = "LICENSE"
 INSTALL_REQUIRES = (
     ("jsonschema", {"min_version": None}),
     ("Jinja2", {"min_version": None}),
+    # PyPI wheels include the libyaml (C) bindings
+    ("PyYAML", {"min_version": None}),
     ("compspec", {"min_version": None}),
     ("compspec-spack", {"min_version": None}),
     ("compspec-modules", {"min_version": None}),
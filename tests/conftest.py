@@ -0,0 +1,18 @@
+import google.generativeai as genai
+import pytest
+
+import fractale.agent.base as base
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """
+    Give agents a Gemini model that never reaches the network on its own.
+    """
+    monkeypatch.setenv("GEMINI_API_KEY", "testing")
+    monkeypatch.delenv("FRACTALE_LLM_CACHE", raising=False)
+    base.get_cache.cache_clear()
+    model = genai.GenerativeModel("testing")
+    monkeypatch.setattr(base, "models", {(base.defaults.gemini_model, None): model})
+    yield model
+    base.get_cache.cache_clear()
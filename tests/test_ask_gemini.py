@@ -0,0 +1,159 @@
+import concurrent.futures
+import datetime
+import threading
+import time
+
+import google.generativeai as genai
+import pytest
+from google.generativeai import protos
+
+import fractale.agent.base as base
+
+
+class StreamingClient:
+    """
+    A stand-in for the Gemini client that streams each response in chunks.
+    """
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def stream_generate_content(self, request, **kwargs):
+        self.requests.append(request)
+        chunks = self.responses.pop(0)
+        for i, text in enumerate(chunks):
+            finish = protos.Candidate.FinishReason.STOP if i == len(chunks) - 1 else 0
+            yield protos.GenerateContentResponse(
+                candidates=[
+                    protos.Candidate(
+                        content=protos.Content(role="model", parts=[protos.Part(text=text)]),
+                        finish_reason=finish,
+                    )
+                ],
+                usage_metadata={
+                    "prompt_token_count": 10,
+                    "candidates_token_count": i + 1,
+                    "total_token_count": 11 + i,
+                },
+            )
+
+
+class ChatAgent(base.GeminiAgent):
+    name = "chat"
+
+
+@pytest.fixture
+def agent(gemini):
+    return ChatAgent(save_incremental=True)
+
+
+def test_stop_at_code_block_keeps_chat_usable(agent):
+    """
+    Stopping a streamed chat response early must not break the next request.
+    """
+    client = StreamingClient(
+        [
+            ["Here:\n```yaml\nkind: Job\n", "```\n", "Some narration we do not need."],
+            ["```yaml\nkind: Job\nmetadata: {}\n", "```"],
+        ]
+    )
+    agent.model._client = client
+
+    first = agent.ask_gemini("generate", until_code_block="yaml")
+    assert first == "Here:\n```yaml\nkind: Job\n```"
+    second = agent.ask_gemini("again", until_code_block="yaml")
+    assert second == "```yaml\nkind: Job\nmetadata: {}\n```"
+
+    # The second request carries the first turn as we read it
+    sent = [part.text for content in client.requests[1].contents for part in content.parts]
+    assert sent == ["generate", first, "again"]
+    assert [c.role for c in agent.chat.history] == ["user", "model", "user", "model"]
+
+    # We don't know the token counts of a response we stopped reading
+    first_meta, second_meta = agent.metadata["ask_gemini"]
+    assert first_meta["truncated"] is True
+    assert first_meta["total_token_count"] is None
+    assert second_meta["truncated"] is False
+    assert second_meta["total_token_count"] == 12
+
+
+def test_truncated_response_is_cached_as_read(agent, monkeypatch, tmp_path):
+    """
+    The cache keeps the text we read from a truncated response, without a token count.
+    """
+    monkeypatch.setenv("FRACTALE_LLM_CACHE", str(tmp_path / "cache.db"))
+    base.get_cache.cache_clear()
+    client = StreamingClient([["```yaml\nkind: Job\n", "```\n", "Narration."]])
+    agent.model._client = client
+
+    first = agent.ask_gemini("generate", until_code_block="yaml")
+    assert first == "```yaml\nkind: Job\n```"
+    cache = base.get_cache()
+    key = cache.key(f"{agent.model.model_name}:{agent.name}", "generate", [])
+    row = cache.db.execute("SELECT content, tokens FROM responses WHERE key = ?", (key,))
+    assert row.fetchone() == (first, None)
+
+    # A new agent with the same (empty) history is answered from the cache
+    other = ChatAgent()
+    other.model._client = client
+    assert other.ask_gemini("generate", until_code_block="yaml") == first
+    assert len(client.requests) == 1
+    assert [c.role for c in other.chat.history] == ["user", "model"]
+
+
+def test_small_system_instruction_is_not_cached(agent, monkeypatch):
+    """
+    An instruction under the minimum cache size should not be sent to the cache.
+    """
+
+    def create(**kwargs):
+        raise AssertionError("CachedContent.create should not be called")
+
+    monkeypatch.setattr(genai.caching.CachedContent, "create", create)
+    model = agent.get_cached_model("A short static instruction.")
+    assert model.cached_content is None
+    assert model._system_instruction.parts[0].text == "A short static instruction."
+    assert agent.get_cached_model("A short static instruction.") is model
+
+
+def test_cached_content_is_created_once(agent, monkeypatch):
+    """
+    Agents in threads asking for the same large instruction should create one cache.
+    """
+    created = []
+
+    class Cache:
+        expire_time = datetime.datetime.max.replace(tzinfo=datetime.timezone.utc)
+
+    def create(**kwargs):
+        created.append(kwargs)
+        time.sleep(0.05)
+        return Cache()
+
+    monkeypatch.setattr(base.GeminiAgent, "cached_contents", {})
+    monkeypatch.setattr(genai.caching.CachedContent, "create", create)
+    monkeypatch.setattr(genai.GenerativeModel, "from_cached_content", lambda cached_content: None)
+    instruction = "x" * (base.defaults.gemini_cache_min_tokens * 4)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda _: agent.get_cached_model(instruction), range(4)))
+    assert len(created) == 1
+
+
+def test_run_many_from_a_pool_worker(gemini, monkeypatch):
+    """
+    run_many from agents that fill the shared pool should not deadlock.
+    """
+    monkeypatch.setattr(ChatAgent, "run", lambda self, context: context)
+    workers = base.defaults.gemini_batch_workers
+    agents = [ChatAgent() for _ in range(workers)]
+
+    # Every worker in the shared pool is busy when run_many is called
+    barrier = threading.Barrier(workers)
+
+    def run_many(agent):
+        barrier.wait(timeout=5)
+        return agent.run_many([1, 2])
+
+    futures = [base.get_executor().submit(run_many, agent) for agent in agents]
+    assert [future.result(timeout=10) for future in futures] == [[1, 2]] * workers
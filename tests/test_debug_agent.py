@@ -0,0 +1,41 @@
+import pytest
+
+import fractale.agent.errors.prompts as prompts
+from fractale.agent.context import get_context
+from fractale.agent.errors import DebugAgent
+
+
+def test_memory_pack_version_is_not_added_to_context(gemini):
+    """
+    The version is the agent's metadata, so it does not leak into other agents' prompts.
+    """
+    context = get_context(
+        {"error_message": "exit 1", "result": "echo hello", "app": "lammps", "details": "x"}
+    )
+    agent = DebugAgent()
+    prompt = agent.get_prompt(context)
+    assert "memory_pack_version" not in context
+    assert "app is defined as: lammps" in prompt
+    version = agent.metadata["memory_pack_version"]
+
+    # Details from the user don't change the version, but the context does
+    context.details = "y"
+    agent.get_prompt(context)
+    assert agent.metadata["memory_pack_version"] == version
+    context.app = "amg"
+    agent.get_prompt(context)
+    assert agent.metadata["memory_pack_version"] != version
+
+
+def test_debug_agents_share_one_model(gemini, monkeypatch):
+    """
+    Each failed attempt makes a DebugAgent, and they should share one model.
+    """
+    monkeypatch.setattr(
+        "fractale.agent.base.GeminiAgent.init",
+        lambda self: pytest.fail("DebugAgent should not start the default chat"),
+    )
+    first, second = DebugAgent(), DebugAgent()
+    assert first.model is second.model
+    assert first.chat is not second.chat
+    assert first.model._system_instruction.parts[0].text == prompts.static_debug_prefix
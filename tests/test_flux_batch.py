@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from fractale.agent.flux.batch.agent import FluxBatchAgent, bash_reminder
+
+
+@pytest.fixture
+def agent(gemini, monkeypatch):
+    agent = FluxBatchAgent(max_attempts=2)
+    prompts = []
+
+    def ask_gemini(prompt, with_history=True):
+        prompts.append(prompt)
+        return "This is not a batch script."
+
+    def validate(context, content):
+        raise ValueError("no script")
+
+    monkeypatch.setattr(agent, "ask_gemini", ask_gemini)
+    monkeypatch.setattr(agent, "validate", validate)
+    agent.prompts = prompts
+    return agent
+
+
+def test_unparseable_responses_use_attempts(agent):
+    """
+    Responses we cannot validate count as attempts, and the prompt does not keep growing.
+    """
+    context = agent.run({"instruction": "Run lammps on 2 nodes", "managed": True})
+    assert context.return_code == -1
+    assert "no script" in context.result
+
+    # Attempts are counted from 0, and we stop once we go past max_attempts
+    assert len(agent.prompts) == 4
+    assert agent.prompts[1].count(bash_reminder) == 1
+    assert agent.prompts[3] == agent.prompts[1]
+
+
+def test_unparseable_responses_exit_when_not_managed(agent):
+    with pytest.raises(SystemExit):
+        agent.run({"instruction": "Run lammps on 2 nodes"})
+    assert len(agent.prompts) == 4
+
+
+def test_run_many_debugs_failed_responses(gemini, monkeypatch):
+    """
+    A failed batch response goes to the debug loop, and each context has its own attempts.
+    """
+    debugged = []
+    asked = []
+
+    threads = set()
+
+    def validate(self, context, content):
+        threads.add(threading.get_ident())
+        if content == "bad":
+            return 1, "bad script"
+        return 0, content
+
+    def debug(self, context, requires=None):
+        debugged.append(context.error_message)
+        return context
+
+    def ask_gemini(self, prompt, with_history=True):
+        asked.append(self.chat.history)
+        return "```bash\ngood\n```"
+
+    monkeypatch.setattr(FluxBatchAgent, "validate", validate)
+    monkeypatch.setattr(FluxBatchAgent, "ask_gemini", ask_gemini)
+    monkeypatch.setattr("fractale.agent.errors.DebugAgent.run", debug)
+
+    agent = FluxBatchAgent(max_attempts=1)
+    monkeypatch.setattr(
+        agent, "ask_gemini_batch", lambda prompts: ["```bash\nbad\n```", "```bash\nbad\n```"]
+    )
+    contexts = [{"instruction": "Run lammps"}, {"instruction": "Run amg"}]
+    results = agent.run_many(contexts)
+
+    # Both contexts were debugged from their own failure, and then succeeded
+    assert debugged == ["bad script", "bad script"]
+    assert [context.result for context in results] == ["good", "good"]
+    assert agent.metadata["generation_attempts"] == 4
+
+    # Like the base run_many, each context runs in its own thread
+    assert threading.get_ident() not in threads
+
+    # The retry continues the chat from the batch request
+    assert [len(history) for history in asked] == [2, 2]
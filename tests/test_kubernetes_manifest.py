@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from fractale.agent.kubernetes.base import replaces_manifest
+from fractale.agent.kubernetes.job import KubernetesJobAgent
+
+manifest = """apiVersion: batch/v1
+kind: Job
+metadata:
+  name: lammps
+spec:
+  template:
+    spec:
+      containers:
+      - name: lammps
+        image: ghcr.io/converged-computing/lammps
+        resources:
+          limits:
+            cpu: 4
+"""
+
+# The optimizer dropped the limits, which must not come back
+optimized = """apiVersion: batch/v1
+kind: Job
+metadata:
+  name: lammps-2
+spec:
+  template:
+    spec:
+      containers:
+      - name: lammps
+        image: ghcr.io/converged-computing/lammps
+"""
+
+fragment = """resources:
+  requests:
+    cpu: 2
+"""
+
+
+@pytest.fixture
+def agent(gemini, monkeypatch):
+    agent = KubernetesJobAgent()
+    agent.asked = []
+
+    def ask_gemini(prompt, with_history=True):
+        agent.asked.append(prompt)
+        return "```yaml\nfrom: llm\n```"
+
+    monkeypatch.setattr(agent, "ask_gemini", ask_gemini)
+    return agent
+
+
+def test_replaces_manifest():
+    assert replaces_manifest(manifest, optimized)
+    assert not replaces_manifest(manifest, fragment)
+    assert not replaces_manifest(manifest, optimized.replace("kind: Job", "kind: Pod"))
+    assert not replaces_manifest(manifest, "apiVersion: batch/v1\nkind: Job\n")
+    assert not replaces_manifest(manifest, "kind: [Job")
+
+
+def test_complete_manifest_replaces_without_llm(agent):
+    updates = {"decision": "RETRY", "reason": "testing", "manifest": f"```yaml\n{optimized}```"}
+    assert agent.update_manifest(updates, manifest) == optimized.strip()
+    assert not agent.asked
+
+
+def test_fragment_is_sent_to_llm_as_text(agent):
+    result = agent.update_manifest({"manifest": f"```yaml\n{fragment}```"}, manifest)
+    assert result == "from: llm"
+    assert fragment.strip() in agent.asked[0]
+    assert json.dumps(fragment.strip()) not in agent.asked[0]
+
+
+def test_fields_are_sent_to_llm_as_json(agent):
+    updates = {"decision": "RETRY", "parallelism": 2}
+    agent.update_manifest(updates, manifest)
+    assert '{"parallelism": 2}' in agent.asked[0]
+
+
+def test_use_llm_merge(agent):
+    agent.use_llm_merge = True
+    assert agent.update_manifest({"manifest": optimized}, manifest) == "from: llm"
+    assert len(agent.asked) == 1